@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Time each stage of generator.py separately and report its throughput and peak memory.
+
+Prints one JSON object per line: the professions file, the number of agents, the
+stage, seconds taken, agents per second and the peak memory traced while the
+stage ran, in total and per agent. Each stage is run once untimed to warm up the
+caches filled on first use, then --repeat times untraced, reporting the fastest,
+then again under tracemalloc for its peak memory, unless --no-memory is given."""
+import argparse
+import glob
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+from math import inf
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import generator  # noqa: E402
+
+STAGES = (
+    "load_data",
+    "character",
+    "character_veterancy",
+    "character_veterancy_no_damaged",
+    "character_equipped",
+    "equip",
+    "build_weapon_list",
+    "record",
+    "add_page",
+    "add_page_2",
+    "save_pdf",
+)
+SEED = "benchmark"
+
+
+def profession_keys(data, n):
+    """The profession keys of a roster of n characters, cycling through every profession in the data."""
+    keys = list(data.professions)
+    return [keys[i % len(keys)] for i in range(n)]
+
+
+def roster(data, n, veterancy=False, damaged=True):
+    """n characters, cycling through every profession in the data."""
+    characters = []
+    for i, key in enumerate(profession_keys(data, n)):
+        characters.append(
+            generator.Need2KnowCharacter(
+                data=data,
+                sex=generator.SEXES[i % 2],
+                profession=data.professions[key],
+                veterancy=veterancy,
+                damaged=damaged,
+                rng=generator.character_rng(SEED, key, i),
+            )
+        )
+    return characters
+
+
+def kits(characters):
+    return [c.profession.get("equipment-kit") for c in characters]
+
+
+def equipped_roster(data, n):
+    """n characters equipped and footnoted, as they are when they are rendered."""
+    characters = roster(data, n)
+    for c, kit in zip(characters, kits(characters)):
+        c.equip(kit)
+        c.print_footnotes()
+    return characters
+
+
+def setup(stage, professions, data, n):
+    """Build the inputs of a stage, outside of its timing. Returns a function running the stage."""
+    if stage == "load_data":
+        options = argparse.Namespace(professions=professions, data_cache=False)
+        return lambda: generator.load_data(options)
+    if stage == "character_equipped":
+        return lambda: equipped_roster(data, n)
+    if stage.startswith("character"):
+        veterancy = stage != "character"
+        damaged = stage != "character_veterancy_no_damaged"
+        return lambda: roster(data, n, veterancy, damaged)
+    if stage == "equip":
+        characters = roster(data, n)
+        return lambda: [c.equip(kit) for c, kit in zip(characters, kits(characters))]
+    if stage == "build_weapon_list":
+        characters = roster(data, n)
+        return lambda: [
+            c.build_weapon_list(data.kit_plans[kit].weapons)
+            for c, kit in zip(characters, kits(characters))
+            if kit
+        ]
+
+    characters = equipped_roster(data, n)
+    if stage == "record":
+        # Memory of a roster of compact records, compare with the "character_equipped" roster
+        # of the characters they hold the sheets of
+        return lambda: [
+            generator.CharacterRecord.from_character(key, c)
+            for key, c in zip(profession_keys(data, n), characters)
+        ]
+    pdf = generator.Need2KnowPDF(io.BytesIO(), [], pages_per_sheet=2)
+    if stage == "add_page":
+        return lambda: [pdf.add_page(c.d) for c in characters]
+    if stage == "add_page_2":
+        return lambda: [pdf.add_page_2(c.e) for c in characters]
+    for c in characters:
+        pdf.add_page(c.d)
+        pdf.add_page_2(c.e)
+    return pdf.save_pdf
+
+
+def measure(stage, professions, data, n, memory, repeat):
+    # Caches such as skill_check_outcomes(), wrap_text() and the glyph widths are filled on
+    # first use, which would count against whichever stage and size happened to run first
+    setup(stage, professions, data, n)()
+    seconds = inf
+    for _ in range(repeat):
+        run = setup(stage, professions, data, n)
+        start = time.perf_counter()
+        run()
+        seconds = min(seconds, time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        run = setup(stage, professions, data, n)
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10, 1000, 50000],
+        help="Roster sizes - defaults to %(default)s.",
+    )
+    parser.add_argument(
+        "--stages",
+        nargs="+",
+        choices=STAGES,
+        default=list(STAGES),
+        help="Stages to run - defaults to all of them.",
+    )
+    parser.add_argument(
+        "--professions",
+        nargs="+",
+        default=sorted(glob.glob(os.path.join(ROOT, "data", "professions-*.json"))),
+        help="Professions files - defaults to every bundled data/professions-*.json.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Timed runs of each stage, of which the fastest is reported - defaults to %(default)s.",
+    )
+    parser.add_argument(
+        "--no-memory", action="store_false", dest="memory", help="Skip the tracemalloc pass."
+    )
+    options = parser.parse_args()
+    # Truncation warnings would swamp the results
+    generator.init_logger(0, stream=sys.stderr)
+
+    for professions in options.professions:
+        data = generator.load_data(argparse.Namespace(professions=professions, data_cache=False))
+        for stage in options.stages:
+            # Loading data doesn't depend on the roster size
+            for n in [None] if stage == "load_data" else options.sizes:
+                seconds, peak = measure(stage, professions, data, n, options.memory, options.repeat)
+                result = {
+                    "professions": os.path.basename(professions),
+                    "agents": n,
+                    "stage": stage,
+                    "seconds": round(seconds, 6),
+                    "per_second": round(n / seconds, 1) if n and seconds else None,
+                    "peak_bytes": peak,
+                    "bytes_per_agent": round(peak / n) if n and peak else None,
+                }
+                print(json.dumps(result), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Measure and enforce the start-up latency of generator.py used as a library.
+
+Each measurement runs in a fresh interpreter. Exits non-zero if the median
+import time or the median time to the first character is over budget."""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from statistics import median
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Milliseconds
+IMPORT_BUDGET = 75
+FIRST_CHARACTER_BUDGET = 150
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import generator
+imported = time.perf_counter()
+assert not any(m.startswith("reportlab") for m in sys.modules), "import loaded reportlab"
+next(generator.generate("agent", seed=1))
+first = time.perf_counter()
+assert not any(m.startswith("reportlab") for m in sys.modules), "generate() loaded reportlab"
+print((imported - start) * 1000, (first - imported) * 1000)
+"""
+
+
+def measure():
+    # Byte-compiling generator.py on every run isn't part of its start-up cost
+    env = {k: v for k, v in os.environ.items() if k != "PYTHONDONTWRITEBYTECODE"}
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return [float(ms) for ms in out.split()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--runs", type=int, default=9, help="Defaults to %(default)s.")
+    options = parser.parse_args()
+
+    # Warm up the bytecode and data caches, which later runs will find
+    measure()
+    runs = [measure() for _ in range(options.runs)]
+    result = {
+        "import_ms": median(r[0] for r in runs),
+        "first_character_ms": median(r[1] for r in runs),
+        "import_budget_ms": IMPORT_BUDGET,
+        "first_character_budget_ms": FIRST_CHARACTER_BUDGET,
+    }
+    result["ok"] = (
+        result["import_ms"] <= IMPORT_BUDGET
+        and result["first_character_ms"] <= FIRST_CHARACTER_BUDGET
+    )
+    print(json.dumps(result, indent=2))
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,84 +1,1243 @@
 #!/usr/bin/env python3
 import argparse
 import csv
+import hashlib
+import io
 import json
 import logging
+import mmap
 import os
+import pickle
+import random
+import re
+import sqlite3
 import sys
+import time
+import tracemalloc
 import warnings
-from collections import defaultdict
+from array import array
+from collections import Counter, defaultdict, deque
+from collections.abc import Mapping, Sequence
+from contextlib import contextmanager, nullcontext
 from copy import copy
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 from datetime import datetime
-from itertools import islice, cycle, chain
-from math import floor
-from random import randint, shuffle, choice, sample, choices
+from functools import lru_cache
+from http import HTTPStatus
+from itertools import accumulate, chain, groupby, islice, permutations, product
+from math import floor, inf, prod
+from operator import index, itemgetter
 from textwrap import shorten, wrap
 from typing import List, Any, Dict, Tuple
+from urllib.parse import parse_qs, urlsplit
 
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
-
-script_name = os.path.basename(sys.argv[0])
 description = """
 Generate characters for the Delta Green pen-and-paper roleplaying game from Arc Dream Publishing.
 """
 __version__ = "1.4"
 
-logger = logging.getLogger(script_name)
+logger = logging.getLogger("dggen")
+
+# Data files are found next to this module, wherever it is run or imported from
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
 
 TEXT_COLOR = (0, 0.1, 0.5)
 DEFAULT_FONT = "Special Elite"
 
 MONTHS = ("JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC")
 SUGGESTED_BONUS_CHANCE = 75
+SEXES = ("female", "male")
+# Characters per unit of work handed to a --jobs worker
+SHARD_SIZE = 50
+# Characters per shard of an analyze sample, and the percentiles it reports
+ANALYSIS_SHARD_SIZE = 2000
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+DAMAGE_KINDS = (
+    "Extreme Violence",
+    "Captivity or Imprisonment",
+    "Hard Experience",
+    "Things Man Was Not Meant to Know",
+)
+# Characters per line of gear and footnotes, so lines of 8pt Special Elite fit their column
+GEAR_WRAP = 50
+NOTE_WRAP = 36
+# Smallest fraction of a field's font size used to fit a value before shortening it
+MIN_FIT = 0.8
 
 
 def main():
+    global owns_process
+    owns_process = True
     options = get_options()
-    init_logger(options.verbosity)
+    # Keep standard output for the data when it is written there
+    init_logger(options.verbosity, sys.stderr if options.output == "-" else sys.stdout)
     logger.debug(options)
 
-    data = load_data(options)
-
+    if options.profile:
+        start_profiling()
+        if options.jobs > 1 or options.pipeline:
+            logger.warning("--profile only sees the main process, use it without --jobs or --pipeline")
+
+    if options.command == "run":
+        return run_manifest(options)
+    with profiled("load"):
+        data = load_data(options)
+    status = None
+    try:
+        if options.command == "serve":
+            return serve(data, options)
+        if options.command == "analyze":
+            status = analyze(data, options)
+        elif options.command == "query":
+            status = query_store(data, options)
+        else:
+            write_roster(data, options, roster_plan(data, options))
+    except (NamesExhaustedError, UnknownProfessionError, UnmetRequirementError) as e:
+        logger.error("%s", e)
+        return 1
+    if options.profile:
+        write_profile(options.profile)
+    return status
+
+
+def write_profile(path):
+    with open(path, "w") as f:
+        json.dump(profiler.report(), f, indent=2)
+
+
+def write_roster(data, options, plan):
+    """Write the characters in the plan to --output as --format, and to --store."""
+    if options.require:
+        check_requirements(data, options, plan)
+    if options.format == "pdf" and options.section_cache:
+        write_cached_pdf(data, options, plan, options.output)
+    elif options.format == "pdf":
+        write_pdf(data, options, plan, options.output)
+    elif options.format == "none":
+        deque(generate_roster(data, options, plan), maxlen=0)
+    else:
+        write_records(data, options, plan)
+    if options.require:
+        report_requirements(data, options, plan)
+
+    if options.store:
+        logger.info("Stored the characters in %s", options.store)
+    if not options.volume_size and options.format != "none":
+        logger.info("Wrote %s", options.output)
+
+
+def write_pdf(data, options, plan, output, roster=None):
+    """Render the characters in the plan to a PDF file name or file object, or each
+    (profession key, d, e) of roster if given, which must follow the plan.
+
+    With --volume-size the roster is split into volumes of that many characters,
+    each a PDF of its own, see volume_path(). ReportLab holds every page of a PDF in
+    memory until it is saved, so saving each volume as soon as it is full keeps the
+    memory used the same however large the roster is."""
+    if roster is None and renders_on_workers(options):
+        return write_pdf_on_workers(data, options, plan, output)
+    volumes = volume_plans(plan, options.volume_size)
+    if roster is None:
+        roster = generate_roster(data, options, plan)
+    try:
+        for number, volume in enumerate(volumes, 1):
+            path = volume_path(output, number) if options.volume_size else output
+            write_volume(data, options, volume, islice(roster, volume_count(volume)), path)
+            if options.volume_size:
+                logger.info("Wrote volume %d of %d, %s", number, len(volumes), path)
+    finally:
+        roster.close()
+
+
+def write_volume(data, options, volume, roster, output):
+    """Render a volume of (profession key, d, e) characters, with its own cover,
+    table of contents and bookmarks."""
     pages_per_sheet = 2 if options.equip else 1
-    professions = [data.professions[options.type]] if options.type else data.professions.values()
-    p = Need2KnowPDF(options.output, professions, pages_per_sheet=pages_per_sheet)
+    professions = [data.professions[profession_key] for profession_key, _ in volume]
+    p = Need2KnowPDF(output, professions, pages_per_sheet=pages_per_sheet, background=options.background)
 
     ## TODO: Maybe an option to skip cover, especially for single sheets
     p.add_cover()
     ## Moved TOC here instead of Need2KnowPDF.init() so cover could precede it
     if len(professions) > 1:
-        p.generate_toc(professions, pages_per_sheet)
+        p.generate_toc(professions, [count for _, count in volume], pages_per_sheet)
 
-    for profession in professions:
-        label = generate_label(profession)
-        p.bookmark(label)
-        for sex in islice(
-            cycle(["female", "male"]), options.count or profession["number_to_generate"]
-        ):
-            c = Need2KnowCharacter(
-                data=data,
-                sex=sex,
-                profession=profession,
-                label_override=options.label,
-                employer_override=options.employer,
-                min_age=options.min_age,
-                max_age=options.max_age,
-                veterancy=options.veterancy,
-                damaged=options.damaged,
+    current = None
+    for profession_key, d, e in roster:
+        if profession_key != current:
+            current = profession_key
+            p.bookmark(generate_label(data.professions[profession_key]))
+
+        with profiled("rendering", profession_key):
+            p.add_page(d)
+            if pages_per_sheet >= 2:
+                p.add_page_2(e)
+
+    with profiled("save"):
+        p.save_pdf()
+
+
+def renders_on_workers(options):
+    """Whether the pages of a PDF can be rendered on the --jobs processes as well.
+    Names handed out with --unique-names and characters written to --store go
+    through this process in roster order, and the pages are put together with
+    pdfrw."""
+    if options.jobs <= 1 or options.unique_names or options.store:
+        return False
+    try:
+        import pdfrw  # noqa: F401
+    except ImportError:
+        logger.info("Rendering the pages in this process, pip install pdfrw to render them on the --jobs")
+        return False
+    return True
+
+
+def write_pdf_on_workers(data, options, plan, output):
+    """Generate and render the characters in the plan in shards on a process pool,
+    each shard a section PDF of its own like write_section() writes, then put
+    each volume together from its shards with assemble_pdf(), with the same
+    cover, table of contents and bookmarks as write_volume() makes.
+
+    As with generate_roster_sheets(), at most the pipeline depth of shards are
+    in progress at once, and each volume's shards are deleted once it is
+    written, so the shards on disk stay bounded too."""
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+
+    volumes = volume_plans(plan, options.volume_size)
+    # A profession can be split between volumes, so its shards follow on from the last volume's
+    starts = Counter()
+    volume_shards = []
+    for volume in volumes:
+        shards = []
+        for profession_key, count in volume:
+            start, end = starts[profession_key], starts[profession_key] + count
+            shards += [(profession_key, i, min(SHARD_SIZE, end - i)) for i in range(start, end, SHARD_SIZE)]
+            starts[profession_key] = end
+        volume_shards.append(shards)
+
+    stats = PipelineStats(options.pipeline or 2 * options.jobs)
+    with tempfile.TemporaryDirectory(prefix="dggen-") as tmp, ProcessPoolExecutor(
+        max_workers=options.jobs, initializer=init_worker, initargs=(options,)
+    ) as executor:
+        paths = iter(
+            (shard, os.path.join(tmp, f"{i:06d}.pdf"))
+            for i, shard in enumerate(chain.from_iterable(volume_shards))
+        )
+        window = deque(
+            (path, executor.submit(render_shard, shard, path)) for shard, path in islice(paths, stats.depth)
+        )
+        try:
+            for number, (volume, shards) in enumerate(zip(volumes, volume_shards), 1):
+                sections = defaultdict(list)
+                for profession_key, _, _ in shards:
+                    counts = stats.take(window)
+                    path, _ = window.popleft()
+                    for shard, following in islice(paths, 1):
+                        window.append((following, executor.submit(render_shard, shard, following)))
+                    requirement_counts.update(counts)
+                    sections[profession_key].append(path)
+                volume_output = volume_path(output, number) if options.volume_size else output
+                with profiled("assemble"):
+                    assemble_pdf(data, options, volume, sections, volume_output)
+                for path in chain.from_iterable(sections.values()):
+                    os.remove(path)
+                if options.volume_size:
+                    logger.info("Wrote volume %d of %d, %s", number, len(volumes), volume_output)
+        finally:
+            for _, future in window:
+                future.cancel()
+            stats.report()
+
+
+# Bump when what a cached section holds changes
+SECTION_CACHE_FORMAT = 1
+# Options the pages of a section depend on, besides the number of characters
+SECTION_OPTIONS = (
+    "seed",
+    "label",
+    "employer",
+    "equip",
+    "veterancy",
+    "damaged",
+    "min_age",
+    "max_age",
+    "require",
+)
+
+
+def write_cached_pdf(data, options, plan, output):
+    """Render the characters in the plan to a PDF, reusing the sections of earlier
+    runs kept in --section-cache.
+
+    Each profession's pages are a PDF of their own in the cache, named after a
+    hash of everything they depend on, see section_key(). Only the sections not
+    in the cache are generated and rendered, then the roster is put together
+    from the sections with pdfrw, see assemble_pdf(), so the time taken depends
+    on how much of the roster changed rather than on its size."""
+    try:
+        import pdfrw  # noqa: F401
+    except ImportError:
+        raise ImportError("--section-cache needs pdfrw - pip install pdfrw") from None
+
+    os.makedirs(options.section_cache, exist_ok=True)
+    sections = {
+        profession_key: [
+            os.path.join(options.section_cache, section_key(data, options, profession_key, count) + ".pdf")
+        ]
+        for profession_key, count in plan
+        if count
+    }
+    stale = [(key, count) for key, count in plan if count and not os.path.exists(sections[key][0])]
+    logger.info("Rendering %d of %d sections, the others are cached", len(stale), len(sections))
+    roster = generate_roster(data, options, stale)
+    try:
+        for profession_key, sheets in groupby(roster, itemgetter(0)):
+            write_section(options, sheets, sections[profession_key][0])
+    finally:
+        roster.close()
+    with profiled("assemble"):
+        assemble_pdf(data, options, plan, sections, output)
+
+
+def section_key(data, options, profession_key, count):
+    """Hash of everything the pages of count characters of a profession depend on:
+    the profession, its kit with the weapons and armour in it, the options, the
+    data files and this module. Not the sheet background, see write_section()."""
+    profession = data.professions[profession_key]
+    kit_name = profession.get("equipment-kit") if options.equip else None
+    key = {
+        "format": SECTION_CACHE_FORMAT,
+        "sources": section_sources(),
+        "profession": [profession_key, profession],
+        "kit": asdict(data.kit_plans[kit_name]) if kit_name else None,
+        "unarmed": data.weapons["unarmed"] if options.equip else None,
+        "count": count,
+        "options": {option: getattr(options, option) for option in SECTION_OPTIONS},
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def section_sources():
+    """Hashes of the files any section depends on, and the ReportLab version."""
+    from reportlab import Version
+
+    paths = [
+        data_path(name)
+        for name in (
+            "boys1986.txt",
+            "girls1986.txt",
+            "surnames.txt",
+            "towns.txt",
+            "distinguishing-features.csv",
+            "SpecialElite.ttf",
+        )
+    ] + [__file__]
+    digests = {"reportlab": Version}
+    for path in paths:
+        with open(path, "rb") as f:
+            digests[os.path.basename(path)] = hashlib.sha256(f.read()).hexdigest()
+    return digests
+
+
+def write_section(options, sheets, path):
+    """Render (profession key, d, e) sheets of one profession to a section PDF,
+    just their pages, written to a temporary file of its own first so the cache
+    never holds part of a section, even with several builds sharing the cache.
+    The sheet backgrounds are left empty, for assemble_pdf() to fill in, so the
+    sections don't each hold a copy of the images."""
+    # tempfile takes a few milliseconds to import, which generating characters can do without
+    import tempfile
+
+    pages_per_sheet = 2 if options.equip else 1
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        p = Need2KnowPDF(tmp, [], pages_per_sheet=pages_per_sheet, background=None)
+        for profession_key, d, e in sheets:
+            with profiled("rendering", profession_key):
+                p.add_page(d)
+                if pages_per_sheet >= 2:
+                    p.add_page_2(e)
+        with profiled("save"):
+            p.c.save()
+        try:
+            os.replace(tmp, path)
+        except OSError:
+            # Another build wrote the same section, which is just as good
+            if not os.path.exists(path):
+                raise
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def assemble_pdf(data, options, plan, sections, output):
+    """Put the roster PDF together from the section PDFs of each profession in the
+    plan, one or more in order, with a cover, table of contents and back page
+    rendered for it, and the same bookmarks and table of contents links as
+    write_volume() makes.
+
+    The empty sheet backgrounds of every page are replaced with the same form
+    XObjects of the sheet backgrounds, so only one copy of each is written."""
+    from pdfrw import IndirectPdfDict, PdfArray, PdfDict, PdfName, PdfReader, PdfString, PdfWriter
+
+    pages_per_sheet = 2 if options.equip else 1
+    professions = [data.professions[profession_key] for profession_key, _ in plan]
+    frame = io.BytesIO()
+    p = Need2KnowPDF(frame, professions, pages_per_sheet=pages_per_sheet, background=options.background)
+    p.add_cover()
+    if len(professions) > 1:
+        p.generate_toc(professions, [count for _, count in plan], pages_per_sheet, links=False)
+    if pages_per_sheet == 1:
+        p.draw_background(1)
+        p.c.showPage()
+    p.c.save()
+    frame = PdfReader(fdata=frame.getvalue())
+    backgrounds = io.BytesIO()
+    p = Need2KnowPDF(backgrounds, [], background=options.background)
+    for side in (0, 1):
+        p.draw_background(side)
+        p.c.showPage()
+    p.c.save()
+    forms = {
+        name: form
+        for page in PdfReader(fdata=backgrounds.getvalue()).pages
+        for name, form in page.Resources.XObject.items()
+    }
+
+    pages = frame.pages[:2]
+    toc = frame.pages[2] if len(professions) > 1 else None
+    bookmarks = [("Table of Contents", toc)] if toc else []
+    # (line of the table of contents, page it links to)
+    links = []
+    for line, (profession_key, count) in enumerate(plan):
+        if not count:
+            continue
+        section = [page for path in sections[profession_key] for page in PdfReader(path).pages]
+        bookmarks.append((generate_label(data.professions[profession_key]), section[0]))
+        links.append((line, section[0]))
+        pages += section
+    if pages_per_sheet == 1:
+        bookmarks.append(("Back Page", frame.pages[-1]))
+        links.append((len(plan), frame.pages[-1]))
+        pages.append(frame.pages[-1])
+    if toc:
+        pages.insert(2, toc)
+        toc.Annots = PdfArray(
+            PdfDict(
+                Type=PdfName.Annot,
+                Subtype=PdfName.Link,
+                Rect=PdfArray(Need2KnowPDF.toc_link_rect(line)),
+                Border=PdfArray([0, 0, 0]),
+                Dest=PdfArray([page, PdfName.Fit]),
             )
+            for line, page in links
+        )
+
+    for page in pages:
+        xobjects = page.Resources.XObject or {}
+        for name in xobjects.keys() & forms.keys():
+            xobjects[name] = forms[name]
+
+    writer = PdfWriter(output)
+    writer.addpages(pages)
+    root = writer.trailer.Root
+    # Outline entries refer to each other, so they must be indirect objects
+    outlines = IndirectPdfDict(Type=PdfName.Outlines)
+    entries = [
+        IndirectPdfDict(Title=PdfString.encode(title), Parent=outlines, Dest=PdfArray([page, PdfName.Fit]))
+        for title, page in bookmarks
+    ]
+    for entry, following in zip(entries, entries[1:]):
+        entry.Next, following.Prev = following, entry
+    if entries:
+        outlines.First, outlines.Last, outlines.Count = entries[0], entries[-1], len(entries)
+        root.Outlines = outlines
+        root.PageMode = PdfName.UseOutlines
+    writer.trailer.Info = frame.Info
+    writer.write()
+
+
+def volume_plans(plan, volume_size=None):
+    """Split a roster plan into plans of volume_size characters, the last one possibly
+    smaller. A profession can be split between two volumes."""
+    if not volume_size:
+        return [plan]
+    volumes, volume, room = [], [], volume_size
+    for profession_key, count in plan:
+        while count:
+            n = min(count, room)
+            volume.append((profession_key, n))
+            count -= n
+            room -= n
+            if not room:
+                volumes.append(volume)
+                volume, room = [], volume_size
+    if volume or not volumes:
+        volumes.append(volume)
+    return volumes
+
+
+def volume_count(volume):
+    return sum(count for _, count in volume)
+
+
+def volume_path(output, number):
+    """roster.pdf becomes roster-vol001.pdf, roster-vol002.pdf..."""
+    root, ext = os.path.splitext(output)
+    return f"{root}-vol{number:03d}{ext}"
+
+
+def generate(profession_key, count=1, seed=None, start=0, professions=None, **overrides):
+    """Return an iterator of count Need2KnowCharacter of one profession, for use as
+    a library.
+
+    With a seed, the characters are numbers start to start+count-1 of the same
+    seeded roster the command line would generate with --seed.
+
+    overrides are any of the command line options, by their option name, e.g.
+    equip=False or veterancy=True. They are checked as the command line checks
+    them, and the profession and its requirements too, when this is called
+    rather than when the first character is generated, raising ValueError,
+    KeyError or UnmetRequirementError. The data files are loaded the first time
+    this is called, and ReportLab isn't loaded at all."""
+    options = build_parser().parse_args([])
+    for option, value in overrides.items():
+        if not hasattr(options, option):
+            raise TypeError(f"generate() got an unexpected option {option!r}")
+        setattr(options, option, value)
+    options.seed = seed
+    check_options(options)
+    data = get_data(professions or options.professions)
+    if profession_key not in data.professions:
+        raise KeyError(f"Unknown profession {profession_key!r}")
+    if options.require:
+        parse_requirements(tuple(options.require)).stages(data.professions[profession_key], options)
+    return generate_characters(data, options, profession_key, start, count)
+
+
+@lru_cache(maxsize=None)
+def get_data(professions, data_cache=True):
+    """Load the data for a professions file, once per process."""
+    return load_data(argparse.Namespace(professions=professions, data_cache=data_cache))
+
+
+def character_rng(seed, profession_key, index):
+    """The random stream of character number index of a profession.
+
+    With a seed, each character's stream is keyed on (seed, profession, index) alone,
+    so any character can be regenerated without generating the ones before it, and
+    shards generated in parallel match a serial run."""
+    rng_class = CountingRandom if profiler else random.Random
+    if seed is None:
+        return rng_class()
+    key = hashlib.blake2b(f"{seed}\0{profession_key}\0{index}".encode(), digest_size=16)
+    return rng_class(int.from_bytes(key.digest(), "big"))
+
+
+class Profile(object):
+    """Wall and CPU time per stage and per profession, and counts of events on hot paths."""
+
+    def __init__(self):
+        self.stages = defaultdict(lambda: {"wall": 0.0, "cpu": 0.0})
+        self.professions = defaultdict(lambda: {"wall": 0.0, "cpu": 0.0})
+        self.counts = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name, profession_key=None):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            for totals in [self.stages[name]] + (
+                [self.professions[profession_key]] if profession_key else []
+            ):
+                totals["wall"] += wall
+                totals["cpu"] += cpu
+
+    def report(self):
+        return {
+            "stages": self.stages,
+            "professions": self.professions,
+            "counts": self.counts,
+            "peak_memory_bytes": tracemalloc.get_traced_memory()[1],
+        }
+
+
+class CountingRandom(random.Random):
+    """random.Random counting its draws into the profile."""
+
+    def random(self):
+        profiler.counts["rng draws"] += 1
+        return super().random()
+
+    def getrandbits(self, k):
+        profiler.counts["rng draws"] += 1
+        return super().getrandbits(k)
+
+
+# The Profile of this run with --profile, None otherwise
+profiler = None
+NOT_PROFILED = nullcontext()
+# Whether this process is the command line or one of its workers, rather than an
+# application using this module, so it can change ReportLab's process-wide settings
+owns_process = False
+
+
+def start_profiling():
+    global profiler
+    profiler = Profile()
+    tracemalloc.start()
+
+
+def profiled(stage, profession_key=None):
+    """Context manager timing a stage into the profile, when profiling."""
+    return profiler.stage(stage, profession_key) if profiler else NOT_PROFILED
+
+
+def roster_plan(data, options):
+    """List the (profession key, number of characters) pairs to generate, in roster order."""
+    if options.type and options.type not in data.professions:
+        raise UnknownProfessionError(f"Unknown profession {options.type!r} in {options.professions}")
+    keys = [options.type] if options.type else list(data.professions)
+    return [
+        (key, options.count or data.professions[key]["number_to_generate"]) for key in keys
+    ]
+
+
+def generate_sheets(data, options, profession_key, start, count):
+    """Yield the (d, e) dicts of characters start to start+count-1 of a profession."""
+    for c in generate_characters(data, options, profession_key, start, count):
+        yield c.d, c.e
+
+
+def generate_characters(data, options, profession_key, start, count):
+    """Yield characters start to start+count-1 of a profession, equipped if options.equip.
+
+    With --require, each character is generated again until it meets the
+    requirements, see Requirements."""
+    profession = data.professions[profession_key]
+    requirements = stages = None
+    min_age, max_age = options.min_age, options.max_age
+    if options.require:
+        requirements = parse_requirements(tuple(options.require))
+        stages = requirements.stages(profession, options)
+        min_age, max_age = stages.min_age, stages.max_age
+    for i in range(start, start + count):
+        rng = character_rng(options.seed, profession_key, i)
+        with profiled("generation", profession_key):
+            for tries in range(1, Requirements.MAX_TRIES + 1):
+                c = Need2KnowCharacter(
+                    data=data,
+                    sex=SEXES[i % len(SEXES)],
+                    profession=profession,
+                    label_override=options.label,
+                    employer_override=options.employer,
+                    min_age=min_age,
+                    max_age=max_age,
+                    veterancy=options.veterancy,
+                    damaged=options.damaged,
+                    rng=rng,
+                    stages=stages,
+                )
+                if not requirements or requirements.met(c):
+                    break
+            else:
+                raise UnmetRequirementError(
+                    f"Gave up on a {profession['label']} meeting {requirements} after {tries} tries"
+                )
+        if requirements:
+            requirement_counts["agents"] += 1
+            requirement_counts["tries"] += tries
+        with profiled("equipment", profession_key):
             if options.equip:
                 c.equip(profession.get("equipment-kit", None))
             c.print_footnotes()
+        yield c
+
+
+def generate_roster(data, options, plan):
+    """Yield (profession key, d, e) for every character in the plan, in roster order.
+
+    With --unique-names, names are handed out here, in roster order, so they are
+    unique across the whole roster however it was generated. With --store, each
+    character is also written to the store."""
+    roster = generate_roster_sheets(data, options, plan)
+    if options.unique_names:
+        roster = name_roster(data, options, plan, roster)
+    if options.store:
+        roster = store_roster(options, roster)
+    yield from roster
+
+
+def name_roster(data, options, plan, roster):
+    names = UniqueNames(data, character_rng(options.seed, "--unique-names", 0))
+    for sex in SEXES:
+        wanted = sum(len(range(SEXES.index(sex), count, len(SEXES))) for _, count in plan)
+        if wanted > names.available(sex):
+            raise NamesExhaustedError(
+                f"The roster needs {wanted} unique {sex} names, there are only {names.available(sex)}"
+            )
+    for profession_key, d, e in roster:
+        d["name"] = names.draw("male" if "male" in d else "female")
+        yield profession_key, d, e
+
+
+def generate_roster_sheets(data, options, plan):
+    """Yield (profession key, d, e) for every character in the plan, in roster order.
+
+    With --jobs or --pipeline the characters are generated in shards on a process
+    pool while they are rendered or written here. At most the pipeline depth of
+    shards are generated ahead, so memory stays bounded when generating is faster
+    than rendering, and the shards are handed back in the same order as a serial
+    run. See PipelineStats for how long rendering waited on the pool."""
+    if options.jobs <= 1 and not options.pipeline:
+        for profession_key, count in plan:
+            for d, e in generate_sheets(data, options, profession_key, 0, count):
+                yield profession_key, d, e
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    shards = iter(
+        [
+            (profession_key, start, min(SHARD_SIZE, count - start))
+            for profession_key, count in plan
+            for start in range(0, count, SHARD_SIZE)
+        ]
+    )
+    workers = max(options.jobs, 1)
+    stats = PipelineStats(options.pipeline or 2 * workers)
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=(options,)
+    ) as executor:
+        window = deque(
+            (shard, executor.submit(generate_shard, shard)) for shard in islice(shards, stats.depth)
+        )
+        try:
+            while window:
+                sheets, counts = stats.take(window)
+                (profession_key, _, _), _ = window.popleft()
+                # Keep the workers busy while this shard is consumed
+                for shard in islice(shards, 1):
+                    window.append((shard, executor.submit(generate_shard, shard)))
+                requirement_counts.update(counts)
+                for d, e in sheets:
+                    yield profession_key, d, e
+        finally:
+            for _, future in window:
+                future.cancel()
+            stats.report()
+
+
+class PipelineStats(object):
+    """Queue depth and stall time of the shards of a pipelined roster.
+
+    A stall is the consumer waiting for the next shard, so the workers can't keep
+    up and more --jobs would help. A full queue is every shard of the pipeline
+    already generated and waiting, so the workers were held back by the consumer
+    and a deeper pipeline or fewer --jobs would do as well."""
+
+    def __init__(self, depth):
+        self.depth = depth
+        self.shards = 0
+        self.stalls = 0
+        self.stall_seconds = 0.0
+        self.ready = 0
+        self.full = 0
+
+    def take(self, window):
+        """Wait for the result of the first shard of the window."""
+        _, future = window[0]
+        ready = sum(1 for _, f in window if f.done())
+        self.shards += 1
+        self.ready += ready
+        self.full += ready == self.depth
+        if future.done():
+            return future.result()
+        self.stalls += 1
+        start = time.perf_counter()
+        with profiled("pipeline stall"):
+            result = future.result()
+        self.stall_seconds += time.perf_counter() - start
+        return result
 
-            p.add_page(c.d)
-            if pages_per_sheet >= 2:
-                p.add_page_2(c.e)
+    def report(self):
+        if not self.shards:
+            return
+        logger.info(
+            "Pipeline of depth %d: waited %.2fs for %d of %d shards, "
+            "%.1f shards ready on average, full %d times",
+            self.depth,
+            self.stall_seconds,
+            self.stalls,
+            self.shards,
+            self.ready / self.shards,
+            self.full,
+        )
+        if profiler:
+            profiler.counts["pipeline shards"] += self.shards
+            profiler.counts["pipeline stalls"] += self.stalls
+            profiler.counts["pipeline ready shards"] += self.ready
+            profiler.counts["pipeline full"] += self.full
+
+
+def write_records(data, options, plan, roster=None):
+    """Write each character as a JSONL or CSV record as soon as it is generated, or
+    each (profession key, d, e) of roster if given."""
+    if roster is None:
+        roster = generate_roster(data, options, plan)
+    f = sys.stdout if options.output == "-" else open(options.output, "w", newline="")
+    try:
+        if options.format == "csv":
+            fields = ["type"] + list(Need2KnowPDF.field_xys)
+            writer = csv.DictWriter(f, fields, restval="", extrasaction="ignore")
+            writer.writeheader()
+            # Fields the sheet has no place for are left out, as they are from the PDF
+            dropped = set(fields)
+            for profession_key, d, e in roster:
+                row = {"type": profession_key, **d, **e}
+                unknown = row.keys() - dropped
+                if unknown:
+                    logger.error("Unknown fields %s left out of the CSV", ", ".join(sorted(unknown)))
+                    dropped |= unknown
+                writer.writerow(row)
+        else:
+            for profession_key, d, e in roster:
+                f.write(json.dumps({"type": profession_key, "d": d, "e": e}) + "\n")
+    finally:
+        if f is not sys.stdout:
+            f.close()
+
+
+class NamesExhaustedError(Exception):
+    pass
+
+class UnknownProfessionError(Exception):
+    pass
+
+
+class UnmetRequirementError(Exception):
+    pass
+
+
+# Tries made to meet --require in this process, see generate_characters()
+requirement_counts = Counter()
+
+
+@lru_cache(maxsize=None)
+def parse_requirements(clauses):
+    return Requirements(clauses)
+
+
+class Requirements(object):
+    """Parsed --require clauses, e.g. "str >= 15, firearms >= 70, not damaged".
+
+    A clause compares a stat, derived attribute, skill or the age with a number, or
+    is "damaged" or "not damaged". Clauses are separated by commas or "and".
+
+    The stats, the skills and the damage are drawn from their distributions given
+    what any character meeting the requirements must have had at that stage, see
+    RequiredStages, and the finished character is started again if it still misses
+    them. Each stage is independent of the ones before it, so the characters have
+    the same distribution as if the misses of unconditioned generation were thrown
+    away, without drawing all of them."""
+
+    CLAUSE = re.compile(r"^(?P<field>[a-z][a-z0-9 ]*?) ?(?P<op>>=|<=|==|>|<) ?(?P<value>-?\d+)$")
+    ABBREVIATIONS = {
+        "str": "strength",
+        "con": "constitution",
+        "dex": "dexterity",
+        "int": "intelligence",
+        "pow": "power",
+        "cha": "charisma",
+        "hp": "hitpoints",
+        "wp": "willpower",
+        "san": "sanity",
+        "bp": "breaking point",
+    }
+    DERIVED = ("hitpoints", "willpower", "sanity", "breaking point")
+    # Tries at a character, or at its skills, before giving up
+    MAX_TRIES = 100000
+
+    def __init__(self, clauses):
+        self.clauses = []
+        self.bounds = {}
+        self.damaged = None
+        self._stages = {}
+        for clause in chain.from_iterable(re.split(r",|\band\b", c) for c in clauses):
+            clause = " ".join(clause.lower().split())
+            if not clause:
+                continue
+            self.clauses.append(clause)
+            if clause in ("damaged", "not damaged"):
+                self.damaged = clause == "damaged"
+                continue
+            match = self.CLAUSE.match(clause)
+            if not match:
+                raise ValueError(
+                    f"Can't understand the requirement {clause!r}, expected e.g. 'str >= 15' or 'not damaged'"
+                )
+            field = self.ABBREVIATIONS.get(match["field"], match["field"])
+            op, value = match["op"], int(match["value"])
+            low, high = self.bounds.get(field, (-inf, inf))
+            if op in (">=", ">", "=="):
+                low = max(low, value + (op == ">"))
+            if op in ("<=", "<", "=="):
+                high = min(high, value - (op == "<"))
+            self.bounds[field] = (low, high)
+
+    def __str__(self):
+        return ", ".join(self.clauses)
+
+    def met(self, c):
+        if self.damaged is not None and bool(c.damaged_by) != self.damaged:
+            return False
+        for field, (low, high) in self.bounds.items():
+            value = c.age if field == "age" else c.d.get(field, 0)
+            if not low <= value <= high:
+                return False
+        return True
+
+    def stages(self, profession, options):
+        """The RequiredStages of a profession, worked out once per profession and options."""
+        key = (id(profession), options.min_age, options.max_age, options.veterancy, options.damaged)
+        stages = self._stages.get(key)
+        # The dict may have been freed and its id reused by another
+        if stages is None or stages.profession is not profession:
+            stages = self._stages[key] = RequiredStages(self, profession, options)
+        return stages
+
+
+class RequiredStages(object):
+    """How a profession's stats, skills and damage are drawn to meet Requirements.
+
+    Veterancy only lowers stats and only raises skills, by at most an amount that
+    doesn't depend on the character, so each requirement is widened by that amount
+    into a bound the stats or skills must be in before veterancy.
+
+    The stats are drawn from their exact distribution within those bounds: each
+    fixed pool's orders within the bounds are listed, and the 4d6 drop lowest
+    scores of a rolled pool are independent, so each is drawn within its own bound.
+    The skills are drawn again until they are within their bounds, and the number
+    of kinds of damage is drawn from the counts allowed."""
+
+    def __init__(self, requirements, profession, options):
+        self.profession = profession
+        self.label = profession["label"]
+        bounds = requirements.bounds
+        skills = profession["skills"]
+        scores = dict(Need2KnowCharacter.DEFAULT_SKILLS)
+        possible = {
+            skill: score for skill, score in skills.get("possible", {}).items() if isinstance(score, int)
+        }
+        fixed = {skill: score for skill, score in skills["fixed"].items() if isinstance(score, int)}
+        known = set(
+            chain(
+                Need2KnowCharacter.STATS,
+                Requirements.DERIVED,
+                ["age", "unnatural"],
+                scores,
+                Need2KnowCharacter.ALL_BONUS,
+                fixed,
+                possible,
+                skills.get("bonus", []),
+            )
+        )
+        unknown = sorted(bounds.keys() - known)
+        if unknown:
+            raise UnmetRequirementError(
+                f"{self.label} characters don't have {', '.join(unknown)}"
+            )
+
+        low, high = bounds.get("age", (-inf, inf))
+        self.min_age, self.max_age = max(options.min_age, low), min(options.max_age, high)
+        if self.min_age > self.max_age:
+            raise UnmetRequirementError(
+                f"No {self.label} can have {describe_bound('age', low, high)} with --min-age "
+                f"{options.min_age} and --max-age {options.max_age}"
+            )
+
+        may_be_damaged = options.veterancy and options.damaged and requirements.damaged is not False
+        weights = Need2KnowCharacter.DAMAGE_WEIGHTS
+        if requirements.damaged is True:
+            if not (options.veterancy and options.damaged):
+                raise UnmetRequirementError("Only characters with --veterancy can be damaged")
+            weights = (0,) + weights[1:]
+        elif requirements.damaged is False:
+            weights = weights[:1] + (0,) * (len(weights) - 1)
+        self.damage_weights = weights
+
+        # Most that veterancy can lower a stat by, or raise a skill by
+        stat_loss = dict.fromkeys(Need2KnowCharacter.STATS, 0)
+        skill_gain = 0
+        if options.veterancy:
+            for stat in Need2KnowCharacter.PHYSICAL_STATS:
+                stat_loss[stat] = Need2KnowCharacter.stat_losses_at_age(self.max_age)
+            skill_gain = floor(
+                sum(Need2KnowCharacter.skill_checks_at_age(y) for y in range(25, self.max_age + 1))
+            )
+        if may_be_damaged:
+            stat_loss["charisma"] = stat_loss["power"] = 3
+            # All four kinds of damage raise occult by 50, and hard experience by 10 more
+            skill_gain += 60
+
+        self.stat_bounds = []
+        for stat in Need2KnowCharacter.STATS:
+            low, high = bounds.get(stat, (-inf, inf))
+            self.stat_bounds.append((low, high + stat_loss[stat]))
+        self.skill_bounds = [
+            (field, low - skill_gain, high)
+            for field, (low, high) in bounds.items()
+            if field not in Need2KnowCharacter.STATS
+            and field not in Requirements.DERIVED
+            and field != "age"
+        ]
+        self.check_skills(scores, fixed, possible, skills.get("bonus", []), skill_gain)
+
+        self.orders = [
+            [order for order in permutations(pool) if self.within(order)]
+            for pool in Need2KnowCharacter.stat_pools
+        ]
+        counts = rolled_stat_counts()
+        self.rolled = []
+        for low, high in self.stat_bounds:
+            scores_within = [score for score in counts if low <= score <= high]
+            self.rolled.append((scores_within, [counts[score] for score in scores_within]))
+        total = sum(counts.values())
+        # Chance of each of the pools, and of their order, meeting the bounds
+        self.pool_weights = [len(orders) / 720 for orders in self.orders] + [
+            prod(sum(weights) / total for _, weights in self.rolled)
+        ]
+        self.stat_chance = sum(self.pool_weights) / len(self.pool_weights)
+        if not self.stat_chance:
+            raise UnmetRequirementError(
+                f"No {self.label} can have {self.describe(Need2KnowCharacter.STATS, bounds)}"
+            )
 
-    p.save_pdf()
-    logger.info("Wrote %s", options.output)
+    def within(self, stats):
+        return all(low <= score <= high for score, (low, high) in zip(stats, self.stat_bounds))
+
+    @staticmethod
+    def describe(fields, bounds):
+        return ", ".join(
+            describe_bound(field, low, high) for field, (low, high) in bounds.items() if field in fields
+        )
+
+    def check_skills(self, scores, fixed, possible, suggested, skill_gain):
+        """Raise UnmetRequirementError if a skill can never be within its bound.
+
+        A skill can be boosted once for each time it is a suggested bonus skill,
+        and once more as one of all the bonus skills, as long as it stays within 80."""
+        for skill, low, high in self.skill_bounds:
+            start = fixed.get(skill, scores.get(skill, 0))
+            lowest = min(start, possible.get(skill, start))
+            highest = max(start, possible.get(skill, start))
+            boosts = suggested.count(skill) + (skill in Need2KnowCharacter.ALL_BONUS)
+            for _ in range(boosts):
+                if highest + 20 <= 80:
+                    highest += 20
+            if highest < low or lowest > high:
+                raise UnmetRequirementError(
+                    f"No {self.label} can have {describe_bound(skill, low + skill_gain, high)}, "
+                    f"it can only be {lowest} to {highest + skill_gain}"
+                )
+
+    def draw_stats(self, rng):
+        pool = rng.choices(range(len(self.pool_weights)), weights=self.pool_weights)[0]
+        if pool < len(self.orders):
+            return rng.choice(self.orders[pool])
+        return [rng.choices(scores, weights)[0] for scores, weights in self.rolled]
+
+    def skills_possible(self, d):
+        return all(low <= d.get(skill, 0) <= high for skill, low, high in self.skill_bounds)
+
+
+def describe_bound(field, low, high):
+    if low == high:
+        return f"{field} {low}"
+    if high == inf:
+        return f"{field} {low} or more"
+    if low == -inf:
+        return f"{field} up to {high}"
+    return f"{field} {low} to {high}"
+
+
+@lru_cache(maxsize=None)
+def rolled_stat_counts():
+    """How many of the 1296 rolls of 4d6 give each score, dropping the lowest die."""
+    return Counter(sum(dice) - min(dice) for dice in product(range(1, 7), repeat=4))
+
+
+def check_requirements(data, options, plan):
+    """Raise UnmetRequirementError before generating anything if --require can't be met."""
+    requirements = parse_requirements(tuple(options.require))
+    for profession_key, _ in plan:
+        requirements.stages(data.professions[profession_key], options)
+
+
+def report_requirements(data, options, plan):
+    requirements = parse_requirements(tuple(options.require))
+    agents, tries = requirement_counts["agents"], requirement_counts["tries"]
+    if not agents:
+        return
+    logger.info(
+        "%d of %d characters met %s (%.1f%%), with %.1f draws of the skills each",
+        agents,
+        tries,
+        requirements,
+        100 * agents / tries,
+        requirement_counts["skill draws"] / tries,
+    )
+    for profession_key, _ in plan:
+        stages = requirements.stages(data.professions[profession_key], options)
+        logger.info(
+            "%.3f%% of %s characters have stats that could meet them",
+            100 * stages.stat_chance,
+            stages.label,
+        )
+
+
+class UniqueNames(object):
+    """Hands out full names that are never repeated.
+
+    Each sex has a space of len(family names) x len(given names) names, drawn without
+    replacement by a lazy Fisher-Yates shuffle: only the swapped positions are
+    stored, so each draw is O(1) however much of the space has been used."""
+
+    def __init__(self, data, rng):
+        self.rng = rng
+        self.family_names = list(dict.fromkeys(n.upper() for n in data.family_names if n))
+        self.given_names = {
+            "male": list(dict.fromkeys(n for n in data.male_given_names if n)),
+            "female": list(dict.fromkeys(n for n in data.female_given_names if n)),
+        }
+        self.remaining = {
+            sex: len(self.family_names) * len(given) for sex, given in self.given_names.items()
+        }
+        self.swaps = {sex: {} for sex in self.given_names}
+        # Some given names are in both lists
+        self.issued = set()
+
+    def available(self, sex):
+        return self.remaining[sex]
+
+    def draw(self, sex):
+        given_names = self.given_names[sex]
+        swaps = self.swaps[sex]
+        while self.remaining[sex]:
+            last = self.remaining[sex] - 1
+            i = self.rng.randrange(last + 1)
+            pick = swaps.pop(i, i)
+            if i != last:
+                swaps[i] = swaps.pop(last, last)
+            self.remaining[sex] = last
+            family, given = divmod(pick, len(given_names))
+            name = self.family_names[family] + ", " + given_names[given]
+            if name not in self.issued:
+                self.issued.add(name)
+                return name
+        raise NamesExhaustedError(f"All of the unique {sex} names have been used")
+
+
+# Data and options of a --jobs worker process, set up once by init_worker
+_worker = {}
+
+
+def init_worker(options):
+    global owns_process
+    owns_process = True
+    _worker["options"] = options
+    _worker["data"] = load_data(options)
+
+
+def generate_shard(shard):
+    """Returns the sheets of a shard, and the worker's requirement_counts for it."""
+    profession_key, start, count = shard
+    requirement_counts.clear()
+    sheets = list(
+        generate_sheets(_worker["data"], _worker["options"], profession_key, start, count)
+    )
+    return sheets, dict(requirement_counts)
+
+
+def render_shard(shard, path):
+    """Render the pages of a shard to a section PDF at path, see write_section().
+    Returns the worker's requirement_counts for it."""
+    profession_key, start, count = shard
+    requirement_counts.clear()
+    sheets = generate_sheets(_worker["data"], _worker["options"], profession_key, start, count)
+    write_section(_worker["options"], ((profession_key, d, e) for d, e in sheets), path)
+    return dict(requirement_counts)
+
+
+def randbelow(rng, n):
+    """rng.randrange(n) without its argument checks, drawing the same numbers from rng."""
+    k = n.bit_length()
+    r = rng.getrandbits(k)
+    while r >= n:
+        r = rng.getrandbits(k)
+    return r
+
+
+def shuffled(rng, population):
+    """rng.sample(population, len(population)), drawing the same numbers from rng,
+    so seeded characters are unchanged, without a method call per draw."""
+    getrandbits = rng.getrandbits
+    pool = list(population)
+    result = []
+    for n in range(len(pool), 0, -1):
+        k = n.bit_length()
+        j = getrandbits(k)
+        while j >= n:
+            j = getrandbits(k)
+        result.append(pool[j])
+        pool[j] = pool[n - 1]
+    return result
+
+
+@dataclass(frozen=True, eq=False)
+class ProfessionSkills:
+    """A profession's skill rules compiled once, see profession_skills().
+
+    base is the default skills updated with the fixed professional skills,
+    possible the (skill, score) pairs possible-count of are picked, suggested the
+    profession's bonus skills and checked the skills veterancy checks before the
+    bonus skills, in the order the rules draw them."""
+    profession: Dict[str, Any]
+    base: Dict[str, Any]
+    possible: Tuple[Tuple[str, Any], ...]
+    possible_count: int
+    suggested: Tuple[str, ...]
+    bond_fields: Tuple[str, ...]
+    checked: Tuple[str, ...]
+
+
+# ProfessionSkills by id() of the profession dict
+_profession_skills = {}
+
+
+def profession_skills(profession):
+    """The ProfessionSkills of a profession, compiled on first use."""
+    compiled = _profession_skills.get(id(profession))
+    # The dict may have been freed and its id reused by another
+    if compiled is None or compiled.profession is not profession:
+        skills = profession["skills"]
+        possible = skills.get("possible", {})
+        compiled = ProfessionSkills(
+            profession=profession,
+            base={**Need2KnowCharacter.DEFAULT_SKILLS, **skills["fixed"]},
+            possible=tuple(possible.items()),
+            possible_count=skills.get("possible-count", 0),
+            suggested=tuple(skills.get("bonus", [])),
+            bond_fields=tuple(f"bond{i}" for i in range(profession["bonds"])),
+            checked=tuple(dict.fromkeys(chain(skills["fixed"], possible))),
+        )
+        _profession_skills[id(profession)] = compiled
+    return compiled
 
 
 class Need2KnowCharacter(object):
@@ -91,6 +1250,9 @@ class Need2KnowCharacter(object):
         [17, 14, 13, 10, 10, 8],
     ]
 
+    # Chances of a damaged veteran having 0 to 4 kinds of damage
+    DAMAGE_WEIGHTS = (80, 10, 5, 4, 1)
+
     DEFAULT_SKILLS = {
         "accounting": 10,
         "alertness": 20,
@@ -173,8 +1335,17 @@ class Need2KnowCharacter(object):
                  max_age=55,
                  veterancy=True,
                  damaged=True,
+                 values=None,
+                 bonus_skills=None,
+                 rng=None,
+                 stages=None,
         ):
+        """values and bonus_skills take the stats and skills from a row of a
+        generate_batch() Batch instead of generating them. rng is the random.Random
+        all of the character's randomness comes from, see character_rng(). stages
+        are the RequiredStages of --require to draw the stats, skills and damage from."""
         self.data = data
+        self.rng = rng or random.Random()
         self.profession = profession
         self.sex = sex
         self.san_lost = 0
@@ -192,10 +1363,21 @@ class Need2KnowCharacter(object):
         )
 
         self.bonus_skills = []
+        # Bonus boosts lost to the skill cap, and the kinds of damage done to a damaged veteran
+        self.skipped_bonus_skills = []
+        self.damaged_by = []
+        self.damage_weights = stages.damage_weights if stages else self.DAMAGE_WEIGHTS
 
         self.generate_demographics(label_override, employer_override, min_age, max_age)
-        self.generate_stats()
-        self.generate_skills()
+        if stages:
+            self.generate_required_stats(stages)
+            self.generate_required_skills(stages)
+        elif values is None:
+            self.generate_stats()
+            self.generate_skills()
+        else:
+            self.d.update(values)
+            self.bonus_skills = list(bonus_skills or [])
         if veterancy:
             self.veterancy(damaged)
         self.generate_derived_attributes()
@@ -204,12 +1386,12 @@ class Need2KnowCharacter(object):
         if self.sex == "male":
             self.d["male"] = "X"
             self.d["name"] = (
-                choice(self.data.family_names).upper() + ", " + choice(self.data.male_given_names)
+                self.rng.choice(self.data.family_names).upper() + ", " + self.rng.choice(self.data.male_given_names)
             )
         else:
             self.d["female"] = "X"
             self.d["name"] = (
-                choice(self.data.family_names).upper() + ", " + choice(self.data.female_given_names)
+                self.rng.choice(self.data.family_names).upper() + ", " + self.rng.choice(self.data.female_given_names)
             )
         self.d["profession"] = label_override or self.profession["label"]
         self.d["employer"] = employer_override or ", ".join(
@@ -217,18 +1399,37 @@ class Need2KnowCharacter(object):
             for e in [self.profession.get("employer", ""), self.profession.get("division", "")]
             if e
         )
-        self.d["nationality"] = "(U.S.A.) " + choice(self.data.towns)
-        self.age = randint(min_age, max_age)
-        self.d["age"] = "%d    (%s %d)" % (self.age, choice(MONTHS), (randint(1, 28)))
+        self.d["nationality"] = "(U.S.A.) " + self.rng.choice(self.data.towns)
+        self.age = self.rng.randint(min_age, max_age)
+        self.d["age"] = "%d    (%s %d)" % (self.age, self.rng.choice(MONTHS), (self.rng.randint(1, 28)))
 
     def generate_stats(self):
-        rolled = [[sum(sorted([randint(1, 6) for _ in range(4)])[1:]) for _ in range(6)]]
-        pool = choice(self.stat_pools + rolled)
-        shuffle(pool)
+        rolled = [[sum(sorted([self.rng.randint(1, 6) for _ in range(4)])[1:]) for _ in range(6)]]
+        # Copy the pool, the shuffle mustn't reorder the shared stat_pools
+        pool = list(self.rng.choice(self.stat_pools + rolled))
+        self.rng.shuffle(pool)
         for score, stat in zip(pool, self.STATS):
             self.d[stat] = score
             logger.debug("%s,stat %s is %s", self, stat, score)
 
+    def generate_required_stats(self, stages):
+        for score, stat in zip(stages.draw_stats(self.rng), self.STATS):
+            self.d[stat] = score
+
+    def generate_required_skills(self, stages):
+        """Draw the skills until they could still meet the requirements."""
+        before = dict(self.d)
+        for _ in range(Requirements.MAX_TRIES):
+            requirement_counts["skill draws"] += 1
+            self.d = dict(before)
+            self.bonus_skills = []
+            self.generate_skills()
+            if stages.skills_possible(self.d):
+                return
+        raise UnmetRequirementError(
+            f"Gave up on the skills of a {self.profession['label']} after {Requirements.MAX_TRIES} tries"
+        )
+
     def generate_derived_attributes(self):
         self.d["hitpoints"] = int(round((self.d["strength"] + self.d["constitution"]) / 2.0))
         self.d["willpower"] = self.d["power"]
@@ -246,51 +1447,51 @@ class Need2KnowCharacter(object):
         self.d["helplessness"] = "  ".join("X" for _ in range(self.adapted_to_helplessness))
 
     def generate_skills(self):
-        # Default skills
-        self.d.update(self.DEFAULT_SKILLS)
-
-        # Professional skills
-        for skill, score in self.profession["skills"]["fixed"].items():
-            self.d[skill] = score
-            logger.debug("%s, set fixed professional skill %s to %s", self, skill, score)
-        self.d.update()
-        for skill, score in sample(
-            list(self.profession["skills"].get("possible", {}).items()),
-            self.profession["skills"].get("possible-count", 0),
-        ):
-            self.d[skill] = score
-            logger.debug("%s, set picked professional skill %s to %s", self, skill, score)
-        for i in range(self.profession["bonds"]):
-            self.d[f"bond{i}"] = self.d["charisma"]
+        skills = profession_skills(self.profession)
+        # Default and fixed professional skills
+        self.d.update(skills.base)
+        # Picked professional skills
+        picked = self.rng.sample(skills.possible, skills.possible_count)
+        self.d.update(picked)
+        logger.debug("%s, picked professional skills %s", self, picked)
+        self.d.update(dict.fromkeys(skills.bond_fields, self.d["charisma"]))
 
         # Bonus skills
         self.generate_bonus_skills()
 
     def generate_bonus_skills(self):
-        potential_bonus_skills = [
-            s
-            for s in self.profession["skills"].get("bonus", [])
-            if randint(1, 100) <= SUGGESTED_BONUS_CHANCE
-        ] + sample(self.ALL_BONUS, len(self.ALL_BONUS))
-        self.apply_bonuses(potential_bonus_skills, 8, 20, 80)
+        self.skipped_bonus_skills = self.apply_bonuses(
+            self.potential_bonus_skills(self.profession), 8, 20, 80
+        )
 
-    def apply_bonuses(self, potential_bonus_skills: list[str],
+    def apply_bonuses(self, potential_bonus_skills,
                       number_of_skills_to_boost: int,
                       boost_by_percentile: int,
-                      max_skill_level: int) -> None:
+                      max_skill_level: int) -> list[str]:
+        """Boost skills in order until enough have been boosted, skipping those the
+        boost would take over max_skill_level. Returns the skipped skills."""
+        if number_of_skills_to_boost <= 0:
+            return []
         bonuses_applied = 0
-        while bonuses_applied < number_of_skills_to_boost:
-            skill = potential_bonus_skills.pop(0)
-            boosted = self.d.get(skill, 0) + boost_by_percentile
-            if boosted <= max_skill_level:
-                self.d[skill] = boosted
-                bonuses_applied += 1
-                self.bonus_skills.append(skill)
-                logger.debug("%s, boosted bonus skill %s by %s%% to %s", self, skill, boost_by_percentile, boosted)
-            else:
-                logger.debug(
-                    "%s, Skipped boost - %s already at %s", self, skill, self.d.get(skill, 0)
-                )
+        skipped = []
+        d = self.d
+        for skill in potential_bonus_skills:
+            boosted = d.get(skill, 0) + boost_by_percentile
+            if boosted > max_skill_level:
+                logger.debug("%s, Skipped boost - %s already at %s", self, skill, d.get(skill, 0))
+                skipped.append(skill)
+                continue
+            d[skill] = boosted
+            self.bonus_skills.append(skill)
+            logger.debug("%s, boosted bonus skill %s by %s%% to %s", self, skill, boost_by_percentile, boosted)
+            bonuses_applied += 1
+            if bonuses_applied == number_of_skills_to_boost:
+                break
+        else:
+            raise IndexError("Not enough skills to boost")
+        if profiler:
+            profiler.counts["bonus skill retries"] += len(skipped)
+        return skipped
 
     def veterancy(self, damaged):
         self.veterancy_skill_boosts()
@@ -306,40 +1507,64 @@ class Need2KnowCharacter(object):
         ## Fixed prof - 4 per year
         ## possible prof - 1/2 of them, 2 per year
         ## Defaults & bonus - 1/4 of them, 2 per year
-        skills_to_check = set(list(self.profession['skills']['fixed'].keys()) +
-                              list(self.profession['skills'].get('possible', {}).keys()) +
-                              # list(self.DEFAULT_SKILLS.keys()) +
-                              self.bonus_skills)
+        # A dict rather than a set, so the order of the draws doesn't depend on string hashing
+        skills_to_check = dict.fromkeys(chain(profession_skills(self.profession).checked,
+                                              # self.DEFAULT_SKILLS,
+                                              self.bonus_skills))
         skill_checks = floor(sum(self.skill_checks_at_age(y) for y in range(25, self.age + 1)))
         for skill in skills_to_check:
             if isinstance(self.d.get(skill, 0), int) and self.d.get(skill, 0) > 0:
+                if profiler:
+                    profiler.counts["veterancy checks"] += skill_checks
                 original = self.d[skill]
-                for _ in range(skill_checks):
-                    current = self.d[skill]
-                    roll = randint(1, 100)
-                    if roll > current or roll == 100:
-                        self.d[skill] += 1
+                self.d[skill] = self.rng.choices(
+                    range(original, original + skill_checks + 1),
+                    cum_weights=self.skill_check_outcomes(original, skill_checks),
+                )[0]
                 logger.debug("%s, veterancy experience %s, %s checks, from %s to %s", self, skill, skill_checks, original, self.d[skill])
 
-    def veterancy_stat_losses(self):
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def skill_check_outcomes(start, checks):
+        """Cumulative probabilities of ending on start, start+1, ... start+checks after
+        making this many experience checks on a skill starting at start.
+
+        A check improves the skill by 1 when a d100 roll is over the current value,
+        and a roll of 100 always improves it."""
+        outcomes = [1.0]
+        for _ in range(checks):
+            after = [0.0] * (len(outcomes) + 1)
+            for i, p in enumerate(outcomes):
+                improve = max(100 - (start + i), 1) / 100
+                after[i] += p * (1 - improve)
+                after[i + 1] += p * improve
+            outcomes = after
+        return tuple(accumulate(outcomes))
+
+    @staticmethod
+    def stat_losses_at_age(age):
         losses = 0
-        if 40 <= self.age <= 49: losses = 1
-        elif 50 <= self.age <= 59: losses = 2
-        elif 60 <= self.age <= 69: losses = 4
-        elif 70 <= self.age <= 79: losses = 8
-        elif 80 <= self.age <= 89: losses = 16
-        elif 90 <= self.age: losses = 32
+        if 40 <= age <= 49: losses = 1
+        elif 50 <= age <= 59: losses = 2
+        elif 60 <= age <= 69: losses = 4
+        elif 70 <= age <= 79: losses = 8
+        elif 80 <= age <= 89: losses = 16
+        elif 90 <= age: losses = 32
+        return losses
+
+    def veterancy_stat_losses(self):
+        losses = self.stat_losses_at_age(self.age)
         while losses and not all(self.d[stat] <= 1 for stat in self.PHYSICAL_STATS):
-            target = choice(self.PHYSICAL_STATS)
+            target = self.rng.choice(self.PHYSICAL_STATS)
             if self.d[target] > 1:
                 self.d[target] -= 1
                 losses -= 1
                 logger.debug("%s, %s decreased by 1 to %s by veterancy", self, target, self.d[target])
 
     def damaged_veteran_changes(self):
-        damage_count = choices(range(5), weights=[80, 10, 5, 4, 1])[0]
+        damage_count = self.rng.choices(range(5), weights=self.damage_weights)[0]
         if damage_count:
-            damage_methods = sample(
+            damage_methods = self.rng.sample(
                 [self.extreme_violence_changes,
                  self.captivity_or_imprisonment_changes,
                  self.hard_experience_changes,
@@ -354,6 +1579,7 @@ class Need2KnowCharacter(object):
                              self.san_lost, self.adapted_to_violence, self.adapted_to_helplessness)
             for i, description in enumerate(damage):
                 self.e[f"detail{i}"] = description
+            self.damaged_by = [description.lstrip("• ") for description in damage[1:]]
 
     def extreme_violence_changes(self, damage: list[str]):
         damage.append("• Extreme Violence")
@@ -375,8 +1601,7 @@ class Need2KnowCharacter(object):
     def hard_experience_changes(self, damage: list[str]):
         damage.append("• Hard Experience")
         self.d["occult"] += 10
-        potential_bonus_skills = sample(self.ALL_BONUS, len(self.ALL_BONUS))
-        self.apply_bonuses(potential_bonus_skills, 5, 10, 90)
+        self.apply_bonuses(shuffled(self.rng, self.ALL_BONUS), 5, 10, 90)
         self.san_lost += 5
         del self.d[f"bond{self.profession['bonds']-1}"]
 
@@ -385,7 +1610,7 @@ class Need2KnowCharacter(object):
         self.d["unnatural"] = self.d.get("unnatural", 0) + 10
         self.d["occult"] += 20
         self.san_lost += self.d["power"]
-        self.d["disorder0"] = "Disorder: " + choice(
+        self.d["disorder0"] = "Disorder: " + self.rng.choice(
             ["Amnesia",
              "Depersonalization",
              "Depression",
@@ -397,11 +1622,14 @@ class Need2KnowCharacter(object):
              ])
 
     def potential_bonus_skills(self, profession):
-        return [
+        """The suggested bonus skills each drawn with SUGGESTED_BONUS_CHANCE, then all
+        of the bonus skills in a random order."""
+        suggested = [
             s
-            for s in profession["skills"].get("bonus", [])
-            if randint(1, 100) <= SUGGESTED_BONUS_CHANCE
-        ] + sample(self.ALL_BONUS, len(self.ALL_BONUS))
+            for s in profession_skills(profession).suggested
+            if randbelow(self.rng, 100) < SUGGESTED_BONUS_CHANCE
+        ]
+        return suggested + shuffled(self.rng, self.ALL_BONUS)
 
     def __str__(self):
         return ", ".join(
@@ -413,66 +1641,54 @@ class Need2KnowCharacter(object):
         )
 
     def distinguishing(self, field, value):
-        return choice(self.data.distinguishing.get((field, value), [""]))
+        return self.rng.choice(self.data.distinguishing.get((field, value), [""]))
 
     def equip(self, kit_name=None):
         weapons = [self.data.weapons["unarmed"]]
         if kit_name:
-            kit = self.data.kits[kit_name]
-            weapons += self.build_weapon_list(kit["weapons"])
+            kit = self.data.kit_plans[kit_name]
+            weapons += self.build_weapon_list(kit.weapons)
 
-            gear = []
-            for item in kit["armour"] + kit["gear"]:
-                if item.get("chance", 100) < randint(1, 100):
+            wrapped_gear = []
+            for chance, notes, text, lines in kit.gear:
+                if chance < self.rng.randint(1, 100):
                     continue
-                notes = (
-                    (" ".join(self.store_footnote(n) for n in item["notes"]) + " ")
-                    if "notes" in item
-                    else ""
-                )
-                text = notes + (self.data.armour[item["type"]] if "type" in item else item["text"])
-                gear.append(text)
+                if notes:
+                    # The footnote markers depend on the character, so these are wrapped here,
+                    # but there are only a few combinations and wrap_text() remembers them
+                    text = " ".join(self.store_footnote(n) for n in notes) + " " + text
+                    lines = wrap_text(text, GEAR_WRAP)
+                wrapped_gear.extend(lines)
 
-            wrapped_gear = list(chain(*[wrap(item, 55, subsequent_indent="  ") for item in gear]))
             if len(wrapped_gear) > 22:
                 logger.warning("Too much gear - truncated.")
-            for i, line in enumerate(wrapped_gear):
+                if profiler:
+                    profiler.counts["gear truncations"] += 1
+            for i, line in enumerate(wrapped_gear[:22]):
                 self.e[f"gear{i}"] = line
 
         if len(weapons) > 7:
             logger.warning("Too many weapons %s - truncated.", weapons)
+            if profiler:
+                profiler.counts["weapon truncations"] += 1
         for i, weapon in enumerate(weapons[:7]):
             self.equip_weapon(i, weapon)
 
-    def build_weapon_list(self, weapons_to_add):
+    def build_weapon_list(self, plan):
+        """Draw the weapons of a compiled kit's weapon plan, see compile_kits()."""
         result = []
-        for weapon_to_add in weapons_to_add:
-            if "type" in weapon_to_add:
-                weapon = copy(self.data.weapons.get(weapon_to_add["type"], None))
-                if weapon:
-                    if "notes" in weapon_to_add:
-                        weapon["notes"] = weapon_to_add["notes"]
-                    result += (
-                        [weapon]
-                        if "chance" not in weapon_to_add
-                        or weapon_to_add["chance"] >= randint(1, 100)
-                        else []
-                    )
-                else:
-                    logger.error("Unknown weapon type %s", weapon_to_add["type"])
-            elif "one-of" in weapon_to_add:
-                result += (self.build_weapon_list([choice(weapon_to_add["one-of"])])
-                           if "chance" not in weapon_to_add
-                              or weapon_to_add["chance"] >= randint(1, 100)
-                           else [])
-            elif "both" in weapon_to_add:
-                result += self.build_weapon_list(w for w in weapon_to_add["both"])
+        for kind, chance, choice in plan:
+            if chance is not None and chance < self.rng.randint(1, 100):
+                continue
+            if kind == "weapon":
+                result.append(choice)
             else:
-                logger.error("Don't understand weapon %r", weapon_to_add)
+                result += self.build_weapon_list(self.rng.choice(choice))
         return result
 
     def equip_weapon(self, slot, weapon):
-        self.e[f"weapon{slot}"] = shorten(weapon["name"], 15, placeholder="…")
+        # Need2KnowPDF fits the name to the width of the column
+        self.e[f"weapon{slot}"] = weapon["name"]
         roll = int(self.d.get(weapon["skill"], 0) + (weapon["bonus"] if "bonus" in weapon else 0))
         self.e[f"weapon{slot}_roll"] = f"{roll}%"
         if "base-range" in weapon:
@@ -524,7 +1740,7 @@ class Need2KnowCharacter(object):
         notes = list(
             chain(
                 *[
-                    wrap(f"{pointer} {note}", 40, subsequent_indent="  ")
+                    wrap_text(f"{pointer} {note}", NOTE_WRAP)
                     for (note, pointer) in list(self.footnotes.items())
                 ]
             )
@@ -532,6 +1748,8 @@ class Need2KnowCharacter(object):
 
         if len(notes) > 12:
             logger.warning("Too many footnotes - truncated.")
+            if profiler:
+                profiler.counts["footnote truncations"] += 1
         for i, note in enumerate(notes[:12]):
             self.e[f"note{i}"] = note
 
@@ -545,6 +1763,145 @@ class Need2KnowCharacter(object):
         )
 
 
+@dataclass
+class Batch:
+    """Stats, derived attributes and skills of n characters of one profession,
+    one row per character and one array per column."""
+    profession: Dict[str, Any]
+    columns: Dict[str, Any]
+    skill_names: Tuple[str, ...]
+    present: Any
+    bonus: Any
+
+    def __len__(self):
+        return len(self.present)
+
+    def rows(self):
+        """Yield (values, bonus_skills) for each character, ready for
+        Need2KnowCharacter(values=..., bonus_skills=...)."""
+        stats = [self.columns[stat] for stat in Need2KnowCharacter.STATS]
+        skills = [self.columns[skill] for skill in self.skill_names]
+        labels = {
+            skill: score
+            for skill, score in self.profession["skills"]["fixed"].items()
+            if not isinstance(score, int)
+        }
+        for i in range(len(self)):
+            values = {stat: int(column[i]) for stat, column in zip(Need2KnowCharacter.STATS, stats)}
+            values.update(
+                (skill, int(column[i]))
+                for skill, column, present in zip(self.skill_names, skills, self.present[i])
+                if present
+            )
+            values.update(labels)
+            for b in range(self.profession["bonds"]):
+                values[f"bond{b}"] = values["charisma"]
+            bonus_skills = [
+                skill for skill, count in zip(self.skill_names, self.bonus[i]) if count
+            ]
+            yield values, bonus_skills
+
+
+def generate_batch(profession, n, seed=None):
+    """Generate the stats, derived attributes and skills of n characters at once with NumPy.
+
+    Follows the same rules as Need2KnowCharacter.generate_stats, generate_skills,
+    generate_bonus_skills and generate_derived_attributes, without veterancy."""
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("generate_batch needs NumPy - pip install numpy") from None
+
+    rng = np.random.default_rng(seed)
+    skills = profession["skills"]
+    fixed = {skill: score for skill, score in skills["fixed"].items() if isinstance(score, int)}
+    possible = list(skills.get("possible", {}).items())
+    suggested = skills.get("bonus", [])
+    skill_names = tuple(
+        dict.fromkeys(
+            chain(
+                Need2KnowCharacter.DEFAULT_SKILLS,
+                Need2KnowCharacter.ALL_BONUS,
+                fixed,
+                (skill for skill, _ in possible),
+                suggested,
+            )
+        )
+    )
+    index = {skill: i for i, skill in enumerate(skill_names)}
+    rows = np.arange(n)
+
+    # Stats - one of the standard pools or 4d6 drop lowest, in a random order
+    pools = np.array(Need2KnowCharacter.stat_pools)
+    pool_choice = rng.integers(0, len(pools) + 1, n)
+    dice = rng.integers(1, 7, (n, 6, 4))
+    rolled = dice.sum(axis=2) - dice.min(axis=2)
+    pool = np.where(
+        (pool_choice < len(pools))[:, None], pools[np.minimum(pool_choice, len(pools) - 1)], rolled
+    )
+    stats = np.take_along_axis(pool, np.argsort(rng.random((n, 6)), axis=1), axis=1)
+
+    # Default, fixed and picked professional skills
+    values = np.zeros((n, len(skill_names)), dtype=np.int16)
+    present = np.zeros((n, len(skill_names)), dtype=bool)
+    for skill, score in chain(Need2KnowCharacter.DEFAULT_SKILLS.items(), fixed.items()):
+        values[:, index[skill]] = score
+        present[:, index[skill]] = True
+    if possible:
+        picks = np.argsort(rng.random((n, len(possible))), axis=1)[
+            :, : skills.get("possible-count", 0)
+        ]
+        for j, (skill, score) in enumerate(possible):
+            picked = (picks == j).any(axis=1)
+            values[picked, index[skill]] = score
+            present[picked, index[skill]] |= True
+
+    # Bonus skills - suggested ones first, then all of them in a random order
+    all_bonus = np.array([index[skill] for skill in Need2KnowCharacter.ALL_BONUS])
+    candidates = np.concatenate(
+        [
+            np.tile(np.array([index[skill] for skill in suggested], dtype=int), (n, 1)),
+            all_bonus[np.argsort(rng.random((n, len(all_bonus))), axis=1)],
+        ],
+        axis=1,
+    )
+    eligible = np.concatenate(
+        [
+            rng.integers(1, 101, (n, len(suggested))) <= SUGGESTED_BONUS_CHANCE,
+            np.ones((n, len(all_bonus)), dtype=bool),
+        ],
+        axis=1,
+    )
+    bonus = np.zeros((n, len(skill_names)), dtype=np.int8)
+    remaining = np.full(n, 8)
+    for j in range(candidates.shape[1]):
+        skill = candidates[:, j]
+        boosted = values[rows, skill] + 20
+        apply = eligible[:, j] & (remaining > 0) & (boosted <= 80)
+        values[rows[apply], skill[apply]] = boosted[apply]
+        present[rows[apply], skill[apply]] = True
+        bonus[rows[apply], skill[apply]] += 1
+        remaining -= apply
+
+    columns = {stat: stats[:, i] for i, stat in enumerate(Need2KnowCharacter.STATS)}
+    columns.update((skill, values[:, i]) for i, skill in enumerate(skill_names))
+
+    # Derived attributes - round() and np.round() both round halves to even
+    columns["hitpoints"] = np.round((columns["strength"] + columns["constitution"]) / 2.0).astype(int)
+    columns["willpower"] = columns["power"]
+    columns["sanity"] = columns["power"] * 5
+    columns["breaking point"] = columns["sanity"] - columns["power"]
+    columns["damage bonus"] = ((columns["strength"] - 1) >> 2) - 2
+
+    return Batch(
+        profession=profession,
+        columns=columns,
+        skill_names=skill_names,
+        present=present,
+        bonus=bonus,
+    )
+
+
 class Need2KnowPDF(object):
     # Location of form fields in Points (1/72 inch) -  0,0 is bottom-left - and font size
     field_xys = {
@@ -765,12 +2122,44 @@ class Need2KnowPDF(object):
         "detail5": (75, 288, 8),
     }
 
+    # Width in Points available to fields that could overflow their box or the next field
+    field_widths = {
+        "name": 258,
+        "employer": 258,
+        "profession": 205,
+        "nationality": 205,
+        **{f"weapon{i}": 82 for i in range(7)},
+        **{f"gear{i}": 244 for i in range(11)},
+        **{f"gear{i}": 227 for i in range(11, 22)},
+        **{f"note{i}": 186 for i in range(4)},
+        **{f"note{i}": 166 for i in range(4, 8)},
+        **{f"note{i}": 186 for i in range(8, 12)},
+    }
+
     # Fields that also get a multiplier
     x5_stats = ["strength", "constitution", "dexterity", "intelligence", "power", "charisma"]
 
-    def __init__(self, filename, professions, pages_per_sheet=1):
+    # Sheet backgrounds, front and back
+    SHEET_IMAGES = ("Character Sheet NO BACKGROUND FRONT.jpg", "Character Sheet NO BACKGROUND BACK.jpg")
+    SHEET_PDF = "Character Sheet NO BACKGROUND.pdf"
+
+    def __init__(self, filename, professions, pages_per_sheet=1, background="raster"):
+        # ReportLab is only needed for PDF output, so it isn't imported until then
+        from reportlab import rl_config
+        from reportlab.pdfgen import canvas
+
+        # ASCII85 only keeps the PDF 7-bit clean, and ReportLab encodes it in pure Python,
+        # every page and the images again for every file, e.g. each --volume-size volume.
+        # It is a setting of the whole process, so an application's own is left alone
+        if owns_process:
+            rl_config.useA85 = 0
+
         self.filename = filename
         self.pages_per_sheet = pages_per_sheet
+        self.background = background
+        self.backgrounds = set()
+        self.layout = self.compile_layout(self.field_xys, self.field_widths)
+        self.unknown_fields = set()
         self.c = canvas.Canvas(self.filename)
         # Set US Letter in points
         self.c.setPageSize((612, 792))
@@ -778,11 +2167,24 @@ class Need2KnowPDF(object):
         self.c.setTitle("Delta Green Agent Roster")
         self.c.setSubject("Pre-generated characters for the Delta Green RPG")
         # Register Custom Fonts
-        pdfmetrics.registerFont(TTFont("Special Elite", "data/SpecialElite.ttf"))
-        pdfmetrics.registerFont(TTFont("OCRA", "data/OCRA.ttf"))
+        register_fonts()
 
-    def generate_toc(self, professions, pages_per_sheet):
-        """Build a clickable Table of Contents on page 1"""
+    @staticmethod
+    def compile_layout(field_xys, field_widths):
+        """Check the field positions and turn them into field: (size, x, y, width)."""
+        layout = {}
+        for field, (x, y, size) in field_xys.items():
+            if not (0 <= x <= 612 and 0 <= y <= 792 and size > 0):
+                raise ValueError(f"Field {field} at ({x}, {y}) size {size} is off the page")
+            layout[field] = (size, x, y, field_widths.get(field, inf))
+        unknown = field_widths.keys() - field_xys.keys()
+        if unknown:
+            raise ValueError(f"Widths given for unknown fields {sorted(unknown)}")
+        return layout
+
+    def generate_toc(self, professions, counts, pages_per_sheet, links=True):
+        """Build a clickable Table of Contents on page 1, for counts characters of each
+        profession. Without links, the lines aren't linked to the pages, see assemble_pdf()."""
         self.bookmark("Table of Contents")
         self.c.setFillColorRGB(0, 0, 0)
         self.c.setFont("OCRA", 10)
@@ -791,36 +2193,33 @@ class Need2KnowPDF(object):
         #self.c.drawString(150, 700, "CLASSIFIED/DG/NTK//")
         #self.c.drawString(150, 688, "SUBJ ROSTER/ACTIVE/NOCELL/CONUS//")
         top = 650
-        pagenum = 2
-        for count, profession in enumerate(professions):
+        # The characters start on the page after this one
+        pagenum = self.c.getPageNumber() + 1
+        for count, (profession, characters) in enumerate(zip(professions, counts)):
             label = generate_label(profession)
             chapter = "{:.<40}".format(shorten(label, 37, placeholder="")) + "{:.>4}".format(
                 pagenum
             )
             self.c.drawString(150, top - self.line_drop(count), chapter)
-            self.c.linkAbsolute(
-                label,
-                label,
-                (145, (top - 6) - self.line_drop(count), 470, (top + 18) - self.line_drop(count)),
-            )
-            pagenum += profession["number_to_generate"] * pages_per_sheet
+            if links:
+                self.c.linkAbsolute(label, label, self.toc_link_rect(count, top))
+            pagenum += characters * pages_per_sheet
         if pages_per_sheet == 1:
             chapter = "{:.<40}".format("Blank Character Sheet Second Page") + "{:.>4}".format(
-                pagenum + profession["number_to_generate"]
-            )
-            self.c.drawString(150, top - self.line_drop(pagenum), chapter)
-            self.c.linkAbsolute(
-                "Back Page",
-                "Back Page",
-                (
-                    145,
-                    (top - 6) - self.line_drop(pagenum),
-                    470,
-                    (top + 18) - self.line_drop(pagenum),
-                ),
+                pagenum
             )
+            self.c.drawString(150, top - self.line_drop(len(professions)), chapter)
+            if links:
+                self.c.linkAbsolute(
+                    "Back Page", "Back Page", self.toc_link_rect(len(professions), top)
+                )
         self.c.showPage()
 
+    @classmethod
+    def toc_link_rect(cls, line, top=650):
+        """Where a line of the table of contents is clicked."""
+        return 145, (top - 6) - cls.line_drop(line), 470, (top + 18) - cls.line_drop(line)
+
     @staticmethod
     def line_drop(count, linesize=22):
         return count * linesize
@@ -829,20 +2228,37 @@ class Need2KnowPDF(object):
         self.c.bookmarkPage(text)
         self.c.addOutlineEntry(text, text)
 
-    def draw_string(self, x, y, size, text):
-        self.c.setFont(DEFAULT_FONT, size)
-        self.c.setFillColorRGB(*TEXT_COLOR)
-        self.c.drawString(x, y, str(text))
-
-    def fill_field(self, field, value):
-        try:
-            x, y, s = self.field_xys[field]
-            self.draw_string(x, y, s, str(value))
-        except KeyError:
+    def fill_fields(self, values):
+        """Draw the values of a page in one text object, fitted to their fields and
+        sorted by font size so the font is only set when the size changes."""
+        unknown = values.keys() - self.layout
+        for field in unknown - self.unknown_fields:
             logger.error("Unknown field %s", field)
+        self.unknown_fields |= unknown
+
+        fitted = []
+        for field, value in values.items():
+            if field in self.layout:
+                s, x, y, width = self.layout[field]
+                if width == inf:
+                    fitted.append((s, str(value), x, y))
+                else:
+                    fitted.append((*fit_text(str(value), DEFAULT_FONT, s, width), x, y))
+        fitted.sort(key=itemgetter(0))
+
+        text = self.c.beginText()
+        text.setFillColorRGB(*TEXT_COLOR)
+        size = None
+        for s, value, x, y in fitted:
+            if s != size:
+                text.setFont(DEFAULT_FONT, s)
+                size = s
+            text.setTextOrigin(x, y)
+            text.textOut(value)
+        self.c.drawText(text)
 
     def add_cover(self):
-        self.c.drawImage("data/front_cover.jpg", 0, 0, 612, 792)
+        self.c.drawImage(data_path("front_cover.jpg"), 0, 0, 612, 792)
         self.c.setFillColorRGB(255,255,255)
         self.c.setFont("OCRA", 24)
         now = datetime.now().strftime("%Y-%m-%dT%H:%MZ")
@@ -850,25 +2266,46 @@ class Need2KnowPDF(object):
         self.c.drawString(20, 55, "CLASSIFIED/DG/NTK//")
         self.c.drawString(20, 25, "SUBJ ROSTER/ACTIVE/NOCELL/CONUS//")
         self.c.showPage()
-        self.c.drawImage("data/inside_cover.jpg", 0, 0, 612, 792)
+        self.c.drawImage(data_path("inside_cover.jpg"), 0, 0, 612, 792)
         self.c.showPage()
 
+    def draw_background(self, side):
+        """Draw the front (0) or back (1) sheet background. Each is drawn once per
+        document into a form XObject, and every page reuses that form. With no
+        background the form is empty, see write_section()."""
+        name = f"background{side}"
+        if name not in self.backgrounds:
+            self.c.beginForm(name)
+            if self.background == "vector":
+                self.draw_vector_background(side)
+            elif self.background:
+                self.c.drawImage(data_path(self.SHEET_IMAGES[side]), 0, 0, 612, 792)
+            self.c.endForm()
+            self.backgrounds.add(name)
+        self.c.doForm(name)
+
+    def draw_vector_background(self, side):
+        try:
+            from pdfrw import PdfReader
+            from pdfrw.buildxobj import pagexobj
+            from pdfrw.toreportlab import makerl
+        except ImportError:
+            raise ImportError("Vector backgrounds need pdfrw - pip install pdfrw") from None
+        page = PdfReader(data_path(self.SHEET_PDF)).pages[side]
+        self.c.doForm(makerl(self.c, pagexobj(page)))
+
     def add_page(self, d):
-        # Add background.  ReportLab will cache it for repeat
-        self.c.drawImage("data/Character Sheet NO BACKGROUND FRONT.jpg", 0, 0, 612, 792)
+        self.draw_background(0)
 
-        for key in d:
-            self.fill_field(key, d[key])
+        self.fill_fields(d)
 
         # Tell ReportLab we're done with current page
         self.c.showPage()
 
     def add_page_2(self, e):
-        # Add background.  ReportLab will cache it for repeat
-        self.c.drawImage("data/Character Sheet NO BACKGROUND BACK.jpg", 0, 0, 612, 792)
+        self.draw_background(1)
 
-        for key in e:
-            self.fill_field(key, e[key])
+        self.fill_fields(e)
 
         # Tell ReportLab we're done with current page
         self.c.showPage()
@@ -876,11 +2313,953 @@ class Need2KnowPDF(object):
     def save_pdf(self):
         if self.pages_per_sheet == 1:
             self.bookmark("Back Page")
-            self.c.drawImage("data/Character Sheet NO BACKGROUND BACK.jpg", 0, 0, 612, 792)
+            self.draw_background(1)
             self.c.showPage()
         self.c.save()
 
 
+class AgentServer(object):
+    """HTTP service generating characters on a pool of warm worker processes.
+
+    GET /agents?type=<profession>&count=<n>&format=json|pdf[&seed=<seed>][&veterancy=1]
+    streams the characters back as a JSON array or a PDF, and GET /metrics reports
+    request latency and queue depth in the Prometheus text format."""
+
+    MAX_COUNT = 1000
+
+    def __init__(self, data, options):
+        self.data = data
+        self.options = options
+        self.executor = None
+        self.server = None
+        self.port = None
+        self.active = 0
+        self.jobs = 0
+        self.responses = defaultdict(int)
+        self.latency_count = 0
+        self.latency_sum = 0.0
+        self.latencies = deque(maxlen=1000)
+
+    async def run(self):
+        import asyncio
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(
+            max_workers=self.options.workers, initializer=init_server_worker, initargs=(self.options,)
+        ) as self.executor:
+            # --port 0 listens on any free port
+            self.server = await asyncio.start_server(self.handle, self.options.host, self.options.port)
+            self.port = self.server.sockets[0].getsockname()[1]
+            logger.warning("Serving on http://%s:%d/", self.options.host, self.port)
+            async with self.server:
+                try:
+                    await self.server.serve_forever()
+                except asyncio.CancelledError:
+                    pass
+
+    async def handle(self, reader, writer):
+        import asyncio
+
+        start = time.perf_counter()
+        status = 500
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+            method, target, _ = request.split(b"\r\n", 1)[0].decode("latin-1").split(" ", 2)
+            url = urlsplit(target)
+            if method != "GET":
+                status = await self.respond(writer, 405, "Only GET is supported\n")
+            elif url.path == "/metrics":
+                status = await self.respond(writer, 200, self.metrics(), "text/plain; version=0.0.4")
+            elif url.path == "/agents":
+                status = await self.agents(writer, parse_qs(url.query))
+            else:
+                status = await self.respond(writer, 404, "Not found\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            status = await self.respond(writer, 400, "Bad request\n")
+        except ConnectionError:
+            status = 499
+        except Exception:
+            logger.exception("Request failed")
+        finally:
+            writer.close()
+            elapsed = time.perf_counter() - start
+            self.responses[status] += 1
+            self.latency_count += 1
+            self.latency_sum += elapsed
+            self.latencies.append(elapsed)
+
+    async def agents(self, writer, query):
+        profession_key = query.get("type", [None])[0]
+        output_format = query.get("format", ["json"])[0]
+        try:
+            count = int(query.get("count", ["1"])[0])
+        except ValueError:
+            count = 0
+        if profession_key not in self.data.professions:
+            return await self.respond(writer, 400, f"Unknown type {profession_key}\n")
+        if not 1 <= count <= self.MAX_COUNT:
+            return await self.respond(writer, 400, f"count must be 1 to {self.MAX_COUNT}\n")
+        if output_format not in ("json", "pdf"):
+            return await self.respond(writer, 400, "format must be json or pdf\n")
+        if self.active >= self.options.queue:
+            return await self.respond(writer, 503, "Too many requests queued\n")
+
+        overrides = {
+            "seed": query.get("seed", [None])[0],
+            "veterancy": query.get("veterancy", ["0"])[0] not in ("0", "false", ""),
+            "count": count,
+            "type": profession_key,
+        }
+        self.active += 1
+        shards = []
+        try:
+            if output_format == "pdf":
+                shards = [self.submit(render_server_pdf, overrides)]
+                pdf = await shards[0]
+                await self.send_headers(writer, 200, "application/pdf")
+                for i in range(0, len(pdf), 65536):
+                    await self.send_chunk(writer, pdf[i : i + 65536])
+            else:
+                shards = [
+                    self.submit(generate_server_shard, overrides, start, min(SHARD_SIZE, count - start))
+                    for start in range(0, count, SHARD_SIZE)
+                ]
+                await self.send_headers(writer, 200, "application/json")
+                separator = "["
+                for shard in shards:
+                    for d, e in await shard:
+                        record = json.dumps({"type": profession_key, "d": d, "e": e})
+                        await self.send_chunk(writer, (separator + record).encode())
+                        separator = ","
+                await self.send_chunk(writer, b"[]" if separator == "[" else b"]")
+            await self.send_chunk(writer, b"")
+        finally:
+            # After a disconnect, don't leave the pool generating shards no one will read
+            for shard in shards:
+                shard.cancel()
+            self.active -= 1
+        return 200
+
+    def submit(self, function, *args):
+        """Hand a job to the worker pool, counting it until it finishes or is
+        cancelled before it starts. A job that has started runs to the end even if
+        its request has gone, and is counted until then."""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        self.jobs += 1
+        future = self.executor.submit(function, *args)
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self.job_done))
+        return asyncio.wrap_future(future)
+
+    def job_done(self):
+        self.jobs -= 1
+
+    def metrics(self):
+        latencies = sorted(self.latencies)
+        lines = [
+            "# TYPE dggen_requests_total counter",
+            *(f'dggen_requests_total{{status="{s}"}} {n}' for s, n in sorted(self.responses.items())),
+            "# TYPE dggen_request_seconds summary",
+            *(
+                f'dggen_request_seconds{{quantile="{q}"}} {latencies[int(q * (len(latencies) - 1))]:.6f}'
+                for q in (0.5, 0.9, 0.99)
+                if latencies
+            ),
+            f"dggen_request_seconds_sum {self.latency_sum:.6f}",
+            f"dggen_request_seconds_count {self.latency_count}",
+            "# TYPE dggen_requests_active gauge",
+            f"dggen_requests_active {self.active}",
+            "# TYPE dggen_queue_depth gauge",
+            f"dggen_queue_depth {max(0, self.jobs - self.options.workers)}",
+            "# TYPE dggen_jobs_in_flight gauge",
+            f"dggen_jobs_in_flight {self.jobs}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    async def send_headers(writer, status, content_type):
+        writer.write(
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            "Transfer-Encoding: chunked\r\n"
+            "Connection: close\r\n\r\n".encode()
+        )
+        await writer.drain()
+
+    @staticmethod
+    async def send_chunk(writer, chunk):
+        writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+        await writer.drain()
+
+    async def respond(self, writer, status, body, content_type="text/plain"):
+        await self.send_headers(writer, status, content_type)
+        if body:
+            await self.send_chunk(writer, body.encode())
+        await self.send_chunk(writer, b"")
+        return status
+
+
+def serve(data, options):
+    # asyncio takes longer to import than the rest of the module, so only the server loads it
+    import asyncio
+
+    if options.workers < 1:
+        options.workers = os.cpu_count() or 1
+    try:
+        asyncio.run(AgentServer(data, options).run())
+    except KeyboardInterrupt:
+        pass
+
+
+def init_server_worker(options):
+    init_worker(options)
+    register_fonts()
+
+
+def server_options(overrides):
+    options = copy(_worker["options"])
+    vars(options).update(overrides)
+    return options
+
+
+def generate_server_shard(overrides, start, count):
+    options = server_options(overrides)
+    return list(generate_sheets(_worker["data"], options, options.type, start, count))
+
+
+def render_server_pdf(overrides):
+    options = server_options(overrides)
+    options.jobs = 1
+    options.pipeline = None
+    options.volume_size = None
+    options.section_cache = None
+    options.store = None
+    pdf = io.BytesIO()
+    write_pdf(_worker["data"], options, roster_plan(_worker["data"], options), pdf)
+    return pdf.getvalue()
+
+
+# Options of a run, which its manifest's jobs can't set
+RUN_OPTIONS = ("command", "manifest", "jobs", "pipeline", "profile", "verbosity")
+
+
+def run_manifest(options):
+    """Run the jobs of a manifest, see read_manifest(), one at a time or on --jobs
+    processes, and print how long each took and why any failed.
+
+    Each process keeps the data of every professions file its jobs use, and the
+    fonts, glyph widths and fitted text, so only the first job using them pays
+    for loading them."""
+    try:
+        jobs = manifest_jobs(options, *read_manifest(options.manifest))
+    except (OSError, ValueError, ImportError) as e:
+        logger.error("%s", e)
+        return 1
+
+    start = time.perf_counter()
+    if options.jobs > 1 and len(jobs) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=min(options.jobs, len(jobs))) as executor:
+            futures = [executor.submit(run_job, job) for job in jobs]
+            results = []
+            for job, future in zip(jobs, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    # The worker died, rather than the job raising
+                    results.append(job_result(job, 0, 0.0, 0.0, e))
+    else:
+        results = [run_job(job) for job in jobs]
+
+    print(run_report(results, time.perf_counter() - start))
+    if options.profile:
+        write_profile(options.profile)
+    return 1 if any(r["error"] for r in results) else 0
+
+
+def read_manifest(path):
+    """Returns the defaults and the jobs of a manifest.
+
+    A manifest is a list of jobs, or a mapping with the jobs and the defaults
+    every job starts from. A job is a mapping of options, by the name of the
+    option as generate() takes them, and an optional name for the report."""
+    with open(path) as f:
+        if os.path.splitext(path)[1].lower() in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("YAML manifests need PyYAML - pip install pyyaml") from None
+            manifest = yaml.safe_load(f)
+        else:
+            manifest = json.load(f)
+    if isinstance(manifest, list):
+        manifest = {"jobs": manifest}
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("jobs"), list):
+        raise ValueError(f"{path}: expected a list of jobs, or a mapping with a list of jobs")
+    unknown = sorted(manifest.keys() - {"defaults", "jobs"})
+    if unknown:
+        raise ValueError(f"{path}: unknown keys {', '.join(unknown)}")
+    defaults = manifest.get("defaults") or {}
+    if not isinstance(defaults, dict) or not all(isinstance(job, dict) for job in manifest["jobs"]):
+        raise ValueError(f"{path}: the defaults and each job must be mappings of options")
+    return defaults, manifest["jobs"]
+
+
+def manifest_jobs(options, defaults, jobs):
+    """The options of each job: those of the run, updated with the defaults and
+    then the job's own settings, checked like the command line's."""
+    actions = {action.dest: action for action in build_parser()._actions}
+    base = job_settings(copy(options), actions, defaults, "defaults")
+    base.command = None
+    base.jobs = 1
+    base.pipeline = None
+    outputs = set()
+    job_options = []
+    for number, settings in enumerate(jobs, 1):
+        settings = dict(settings)
+        name = str(settings.pop("name", None) or settings.get("output") or f"job {number}")
+        job = job_settings(copy(base), actions, settings, name)
+        job.name = name
+        if job.format != "none" and not job.output:
+            raise ValueError(f"{name}: needs an output")
+        if job.output == "-":
+            raise ValueError(f"{name}: jobs can't write to standard output")
+        try:
+            check_options(job)
+        except ValueError as e:
+            raise ValueError(f"{name}: {e}") from None
+        if job.output in outputs:
+            raise ValueError(f"{name}: another job also writes {job.output}")
+        if job.output:
+            outputs.add(job.output)
+        job_options.append(job)
+    return job_options
+
+
+def job_settings(options, actions, settings, name):
+    """Update options with settings, converted and checked like the command line
+    option of the same name would be."""
+    for key, value in settings.items():
+        dest = str(key).replace("-", "_")
+        action = actions.get(dest)
+        if action is None or dest in RUN_OPTIONS or dest == "help":
+            raise ValueError(f"{name}: unknown option {key!r}")
+        if value is None:
+            pass
+        elif action.nargs == 0:
+            if not isinstance(value, bool):
+                raise ValueError(f"{name}: {key} must be true or false")
+        elif dest == "require":
+            value = [value] if isinstance(value, str) else [str(clauses) for clauses in value]
+        else:
+            try:
+                value = action.type(value) if action.type else str(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{name}: {key} can't be {value!r}") from None
+            if action.choices and value not in action.choices:
+                raise ValueError(f"{name}: {key} must be one of {', '.join(action.choices)}")
+        setattr(options, dest, value)
+    return options
+
+
+def run_job(options):
+    """Write the roster of a manifest job, and return how it went, see job_result()."""
+    wall, cpu = time.perf_counter(), time.process_time()
+    agents, error = 0, None
+    # Counts from an earlier job in this process would be reported with this one's
+    requirement_counts.clear()
+    try:
+        data = get_data(os.path.abspath(options.professions), options.data_cache)
+        plan = roster_plan(data, options)
+        write_roster(data, options, plan)
+        agents = sum(count for _, count in plan)
+    except Exception as e:
+        logger.debug("%s failed", options.name, exc_info=True)
+        error = e
+    return job_result(
+        options, agents, time.perf_counter() - wall, time.process_time() - cpu, error
+    )
+
+
+def job_result(options, agents, wall, cpu, error=None):
+    if error is not None:
+        logger.error("%s failed: %s", options.name, error)
+    else:
+        logger.info("%s done, %d agents in %.2fs", options.name, agents, wall)
+    return {
+        "name": options.name,
+        "agents": agents,
+        "wall": wall,
+        "cpu": cpu,
+        "error": f"{type(error).__name__}: {error}" if error is not None else None,
+    }
+
+
+def run_report(results, wall):
+    width = max([len("job")] + [len(r["name"]) for r in results])
+    lines = [f"{'job':<{width}}  {'agents':>7}  {'wall s':>8}  {'cpu s':>8}  result"]
+    for r in results:
+        lines.append(
+            f"{r['name']:<{width}}  {r['agents']:>7}  {r['wall']:>8.2f}  {r['cpu']:>8.2f}  "
+            f"{r['error'] or 'ok'}"
+        )
+    failed = sum(1 for r in results if r["error"])
+    lines.append(f"{len(results)} jobs, {failed} failed, {wall:.2f}s")
+    return "\n".join(lines)
+
+
+# Characters written to the store per transaction
+STORE_BATCH_SIZE = 1000
+# Fields with a column of their own in the store, indexed unless they are derived
+STORE_SKILLS = (
+    "alertness",
+    "athletics",
+    "dodge",
+    "firearms",
+    "humint",
+    "melee weapons",
+    "occult",
+    "persuade",
+    "search",
+    "stealth",
+    "unarmed combat",
+)
+STORE_DERIVED = ("hitpoints", "willpower", "sanity", "breaking point")
+STORE_FIELDS = ("age", *Need2KnowCharacter.STATS, *STORE_DERIVED, *STORE_SKILLS)
+
+
+def store_column(field):
+    return field.replace(" ", "_")
+
+
+def open_store(path):
+    """Open the SQLite store of characters, creating it if need be.
+
+    Each character is a row of agents with its profession key, seed, number in the
+    seeded roster, creation time, number of kinds of damage, a column for each of
+    STORE_FIELDS, and its d and e dicts as JSON."""
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("PRAGMA synchronous = NORMAL")
+    columns = "".join(f", {store_column(field)} INTEGER" for field in STORE_FIELDS)
+    with db:
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS agents (id INTEGER PRIMARY KEY, profession TEXT NOT NULL, "
+            "seed TEXT, number INTEGER NOT NULL, created TEXT NOT NULL, damaged INTEGER NOT NULL"
+            f"{columns}, d TEXT NOT NULL, e TEXT NOT NULL)"
+        )
+        for field in ("profession", "age", *Need2KnowCharacter.STATS, *STORE_SKILLS):
+            column = store_column(field)
+            db.execute(f"CREATE INDEX IF NOT EXISTS agents_{column} ON agents ({column})")
+    return db
+
+
+def store_roster(options, roster):
+    """Pass (profession key, d, e) on from roster, storing each character in
+    --store in batches of STORE_BATCH_SIZE."""
+    db = open_store(options.store)
+    sql = (
+        f"INSERT INTO agents (profession, seed, number, created, damaged, "
+        f"{', '.join(store_column(field) for field in STORE_FIELDS)}, d, e) "
+        f"VALUES ({', '.join('?' * (len(STORE_FIELDS) + 7))})"
+    )
+    created = datetime.now().isoformat(timespec="seconds")
+    numbers = Counter()
+    rows = []
+    try:
+        for profession_key, d, e in roster:
+            age = int(d["age"].split()[0])
+            damaged = sum(1 for field, value in e.items() if field.startswith("detail") and value.startswith("•"))
+            rows.append(
+                (profession_key, options.seed, numbers[profession_key], created, damaged, age)
+                + tuple(d.get(field, 0) for field in STORE_FIELDS[1:])
+                + (json.dumps(d), json.dumps(e))
+            )
+            numbers[profession_key] += 1
+            if len(rows) >= STORE_BATCH_SIZE:
+                with db:
+                    db.executemany(sql, rows)
+                rows.clear()
+            yield profession_key, d, e
+    finally:
+        with db:
+            db.executemany(sql, rows)
+        db.close()
+
+
+def store_where(options):
+    """SQL conditions and parameters selecting the characters meeting -t and --require."""
+    conditions, parameters = [], []
+    if options.type:
+        conditions.append("profession = ?")
+        parameters.append(options.type)
+    if options.require:
+        requirements = parse_requirements(tuple(options.require))
+        if requirements.damaged is not None:
+            conditions.append("damaged > 0" if requirements.damaged else "damaged = 0")
+        for field, (low, high) in requirements.bounds.items():
+            if field in STORE_FIELDS:
+                column, path = store_column(field), []
+            else:
+                column, path = "coalesce(json_extract(d, ?), 0)", [f'$."{field}"']
+            if low == high:
+                conditions.append(f"{column} = ?")
+                parameters += path + [low]
+                continue
+            if low > -inf:
+                conditions.append(f"{column} >= ?")
+                parameters += path + [low]
+            if high < inf:
+                conditions.append(f"{column} <= ?")
+                parameters += path + [high]
+    return " AND ".join(conditions) or "1", parameters
+
+
+def query_store(data, options):
+    """Write the characters in --store meeting -t and --require, at most -c of them,
+    as --format, without generating any. With --take they are removed from the store."""
+    if not os.path.exists(options.store):
+        logger.error("There is no store %s", options.store)
+        return 1
+    db = open_store(options.store)
+    try:
+        where, parameters = store_where(options)
+        order = "random()" if options.random else "id"
+        limit = f" LIMIT {options.count}" if options.count else ""
+        with profiled("query"):
+            found = db.execute(
+                f"SELECT id, profession FROM agents WHERE {where} ORDER BY {order}{limit}", parameters
+            ).fetchall()
+        unknown = {profession_key for _, profession_key in found} - data.professions.keys()
+        if unknown and options.format == "pdf":
+            logger.error(
+                "%s aren't professions in %s", ", ".join(sorted(unknown)), options.professions
+            )
+            return 1
+
+        # Keep each profession together, in the order of the professions file
+        rank = {profession_key: i for i, profession_key in enumerate(data.professions)}
+        found.sort(key=lambda row: (rank.get(row[1], len(rank)), row[1]))
+        plan = [(key, len(list(rows))) for key, rows in groupby(found, key=itemgetter(1))]
+        roster = stored_characters(db, [id for id, _ in found])
+        if options.format == "pdf":
+            write_pdf(data, options, plan, options.output, roster)
+        elif options.format != "none":
+            write_records(data, options, plan, roster)
+        if options.take:
+            with db:
+                db.executemany("DELETE FROM agents WHERE id = ?", ((id,) for id, _ in found))
+    finally:
+        db.close()
+    logger.info("Found %d characters in %s", len(found), options.store)
+    if options.format != "none":
+        logger.info("Wrote %s", options.output)
+
+
+def stored_characters(db, ids):
+    """Yield (profession key, d, e) of the stored characters with these ids, in order."""
+    for first in range(0, len(ids), STORE_BATCH_SIZE):
+        batch = ids[first : first + STORE_BATCH_SIZE]
+        rows = {
+            id: (profession_key, d, e)
+            for id, profession_key, d, e in db.execute(
+                f"SELECT id, profession, d, e FROM agents WHERE id IN ({', '.join('?' * len(batch))})",
+                batch,
+            )
+        }
+        for id in batch:
+            profession_key, d, e = rows[id]
+            yield profession_key, json.loads(d), json.loads(e)
+
+
+def analyze(data, options):
+    """Run samples of each profession through the generation rules, and write the
+    distributions of their stats, skills and veterancy outcomes as JSON.
+
+    Each profession is sampled in shards of ANALYSIS_SHARD_SIZE characters, on a
+    process pool with --jobs. With --precision it stops as soon as every P(value >= x)
+    is known to within that much, see Tally.half_width(). The shards are merged in
+    order, so with a seed the results don't depend on --jobs."""
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        logger.error("analyze needs NumPy - pip install numpy")
+        return 1
+
+    report = {
+        "samples": options.samples,
+        "precision": options.precision,
+        "veterancy": options.veterancy,
+        "damaged": options.damaged,
+        "seed": options.seed,
+        "professions": {},
+    }
+    executor = None
+    if options.jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        executor = ProcessPoolExecutor(
+            max_workers=options.jobs, initializer=init_worker, initargs=(options,)
+        )
+    try:
+        for profession_key, _ in roster_plan(data, options):
+            start_time = time.perf_counter()
+            tally = analyze_profession(data, options, profession_key, executor)
+            report["professions"][profession_key] = tally.report()
+            logger.info(
+                "Analyzed %d %s in %.1fs, to within %.4f",
+                tally.n,
+                profession_key,
+                time.perf_counter() - start_time,
+                tally.half_width(),
+            )
+    finally:
+        if executor:
+            executor.shutdown()
+
+    f = sys.stdout if options.output == "-" else open(options.output, "w")
+    try:
+        json.dump(report, f, indent=1)
+        f.write("\n")
+    finally:
+        if f is not sys.stdout:
+            f.close()
+
+
+def analyze_profession(data, options, profession_key, executor=None):
+    shards = [
+        (profession_key, start, min(ANALYSIS_SHARD_SIZE, options.samples - start))
+        for start in range(0, options.samples, ANALYSIS_SHARD_SIZE)
+    ]
+    tally = Tally(analysis_variables(data.professions[profession_key]))
+    wave = options.jobs if executor else 1
+    for first in range(0, len(shards), wave):
+        if executor:
+            tallies = executor.map(tally_shard, shards[first : first + wave])
+        else:
+            tallies = [tally_characters(data, options, *shards[first])]
+        for shard_tally in tallies:
+            tally.merge(shard_tally)
+            if options.precision and tally.half_width() <= options.precision:
+                return tally
+    return tally
+
+
+def tally_shard(shard):
+    return tally_characters(_worker["data"], _worker["options"], *shard)
+
+
+def tally_characters(data, options, profession_key, start, count):
+    """Tally characters start to start+count-1 of a profession, the same characters a
+    roster with the same seed would have."""
+    profession = data.professions[profession_key]
+    tally = Tally(analysis_variables(profession))
+    rows = []
+    for i in range(start, start + count):
+        with profiled("generation", profession_key):
+            c = Need2KnowCharacter(
+                data=data,
+                sex=SEXES[i % len(SEXES)],
+                profession=profession,
+                min_age=options.min_age,
+                max_age=options.max_age,
+                veterancy=options.veterancy,
+                damaged=options.damaged,
+                rng=character_rng(options.seed, profession_key, i),
+            )
+        rows.append(analysis_row(c, tally.variables))
+        tally.skipped.update(c.skipped_bonus_skills)
+    with profiled("tally", profession_key):
+        tally.add(rows)
+    return tally
+
+
+def analysis_variables(profession):
+    """The numbers analyze reports for a profession: stats, derived attributes, every
+    skill the profession can have, and the outcomes of bonus skills and veterancy."""
+    skills = profession["skills"]
+    return tuple(
+        dict.fromkeys(
+            chain(
+                Need2KnowCharacter.STATS,
+                ("hitpoints", "willpower", "sanity", "breaking point", "damage bonus", "age"),
+                Need2KnowCharacter.DEFAULT_SKILLS,
+                Need2KnowCharacter.ALL_BONUS,
+                (skill for skill, score in skills["fixed"].items() if isinstance(score, int)),
+                (skill for skill, score in skills.get("possible", {}).items() if isinstance(score, int)),
+                skills.get("bonus", []),
+                ("unnatural", "bonus skills skipped", "sanity lost", "damage count"),
+                (f"damaged: {kind}" for kind in DAMAGE_KINDS),
+            )
+        )
+    )
+
+
+def analysis_row(c, variables):
+    outcomes = {
+        "damage bonus": c.damage_bonus,
+        "age": c.age,
+        "bonus skills skipped": len(c.skipped_bonus_skills),
+        "sanity lost": c.san_lost,
+        "damage count": len(c.damaged_by),
+    }
+    outcomes.update((f"damaged: {kind}", 1) for kind in c.damaged_by)
+    row = []
+    for variable in variables:
+        value = outcomes.get(variable, c.d.get(variable, 0))
+        # Skills a character doesn't have are 0%
+        row.append(value if isinstance(value, int) else 0)
+    return row
+
+
+class Tally(object):
+    """Running totals of a sample of one profession's characters: a histogram, sum
+    and sums of products of each variable, from which the means, percentiles and
+    correlations are worked out. Tallies of parts of a sample can be merged."""
+
+    def __init__(self, variables):
+        import numpy as np
+
+        self.variables = variables
+        self.n = 0
+        self.sums = np.zeros(len(variables))
+        self.products = np.zeros((len(variables), len(variables)))
+        self.histograms = [Counter() for _ in variables]
+        self.skipped = Counter()
+
+    def add(self, rows):
+        import numpy as np
+
+        if not rows:
+            return
+        values = np.array(rows, dtype=np.int64)
+        x = values.astype(np.float64)
+        self.n += len(rows)
+        self.sums += x.sum(axis=0)
+        self.products += x.T @ x
+        for histogram, column in zip(self.histograms, values.T):
+            numbers, counts = np.unique(column, return_counts=True)
+            histogram.update(dict(zip(numbers.tolist(), counts.tolist())))
+
+    def merge(self, other):
+        self.n += other.n
+        self.sums += other.sums
+        self.products += other.products
+        for histogram, other_histogram in zip(self.histograms, other.histograms):
+            histogram.update(other_histogram)
+        self.skipped.update(other.skipped)
+
+    def half_width(self):
+        """Half the width of the 95% confidence interval of the least certain
+        P(variable >= x), over every variable and x."""
+        worst = 0
+        for histogram in self.histograms:
+            at_least = self.n
+            for value in sorted(histogram):
+                p = at_least / self.n
+                worst = max(worst, p * (1 - p))
+                at_least -= histogram[value]
+        return 1.96 * (worst / self.n) ** 0.5
+
+    def percentiles(self, histogram):
+        result = {}
+        values = iter(sorted(histogram))
+        value = next(values)
+        below = histogram[value]
+        for q in PERCENTILES:
+            while below < q / 100 * self.n:
+                value = next(values)
+                below += histogram[value]
+            result[q] = value
+        return result
+
+    def report(self):
+        import numpy as np
+
+        mean = self.sums / self.n
+        covariance = self.products / self.n - np.outer(mean, mean)
+        sd = np.sqrt(np.clip(np.diag(covariance), 0, None))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            correlation = covariance / np.outer(sd, sd)
+
+        variables = {}
+        for name, histogram, m, s in zip(self.variables, self.histograms, mean, sd):
+            at_least = self.n
+            cumulative = {}
+            for value in sorted(histogram):
+                cumulative[value] = round(at_least / self.n, 6)
+                at_least -= histogram[value]
+            variables[name] = {
+                "mean": round(float(m), 4),
+                "sd": round(float(s), 4),
+                "percentiles": self.percentiles(histogram),
+                "histogram": {value: histogram[value] for value in sorted(histogram)},
+                "at_least": cumulative,
+            }
+        return {
+            "samples": self.n,
+            "half_width": round(self.half_width(), 6),
+            "variables": variables,
+            # Boosts per character lost to the cap in apply_bonuses, by skill
+            "bonus_skills_skipped": {
+                skill: round(count / self.n, 6) for skill, count in self.skipped.most_common()
+            },
+            "correlations": {
+                "variables": list(self.variables),
+                # None where a variable never changes
+                "matrix": [
+                    [round(float(r), 4) if np.isfinite(r) else None for r in row]
+                    for row in correlation
+                ],
+            },
+        }
+
+
+class CharacterRecord(object):
+    """Compact copy of a character's sheets, for holding large rosters in memory.
+
+    Numbers are kept in an array of small ints with a slot per sheet field, and text
+    is interned, so repeated values such as labels, towns and gear are shared. The
+    d and e attributes are read-only mapping views of the two pages, which
+    Need2KnowPDF.add_page and add_page_2 accept in place of the dicts."""
+
+    __slots__ = ("profession_key", "numbers", "text_fields", "texts")
+
+    FIELDS = tuple(Need2KnowPDF.field_xys)
+    FIELD_INDEX = {field: i for i, field in enumerate(FIELDS)}
+    # Fields from here on are on the second page
+    SECOND_PAGE = FIELDS.index("weapon0")
+    MISSING = -32768
+
+    def __init__(self, profession_key, d, e):
+        self.profession_key = sys.intern(profession_key)
+        self.numbers = array("h", [self.MISSING]) * len(self.FIELDS)
+        text_fields, texts = [], []
+        for field, value in chain(d.items(), e.items()):
+            i = self.FIELD_INDEX[field]
+            if isinstance(value, int):
+                self.numbers[i] = value
+            else:
+                text_fields.append(i)
+                texts.append(sys.intern(value))
+        self.text_fields = array("H", text_fields)
+        self.texts = tuple(texts)
+
+    @classmethod
+    def from_character(cls, profession_key, c):
+        return cls(profession_key, c.d, c.e)
+
+    @property
+    def d(self):
+        return RecordPage(self, 0)
+
+    @property
+    def e(self):
+        return RecordPage(self, 1)
+
+    def get_field(self, i):
+        if self.numbers[i] != self.MISSING:
+            return self.numbers[i]
+        try:
+            return self.texts[self.text_fields.index(i)]
+        except ValueError:
+            raise KeyError(self.FIELDS[i]) from None
+
+    def has_field(self, i):
+        return self.numbers[i] != self.MISSING or i in self.text_fields
+
+
+class RecordPage(Mapping):
+    """Read-only dict view of one page of a CharacterRecord."""
+
+    __slots__ = ("record", "page")
+
+    def __init__(self, record, page):
+        self.record = record
+        self.page = page
+
+    def on_page(self, i):
+        return (i >= CharacterRecord.SECOND_PAGE) == bool(self.page)
+
+    def __getitem__(self, field):
+        i = CharacterRecord.FIELD_INDEX[field]
+        if not self.on_page(i):
+            raise KeyError(field)
+        return self.record.get_field(i)
+
+    def __iter__(self):
+        fields = CharacterRecord.FIELDS
+        return (
+            fields[i]
+            for i in range(len(fields))
+            if self.on_page(i) and self.record.has_field(i)
+        )
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+@lru_cache(maxsize=None)
+def register_fonts():
+    """Register the sheet fonts with ReportLab, once per process."""
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    pdfmetrics.registerFont(TTFont("Special Elite", data_path("SpecialElite.ttf")))
+    pdfmetrics.registerFont(TTFont("OCRA", data_path("OCRA.ttf")))
+
+
+@lru_cache(maxsize=4096)
+def wrap_text(text, width):
+    """textwrap.wrap with a hanging indent, remembered for repeated gear and notes."""
+    return tuple(wrap(text, width, subsequent_indent="  "))
+
+
+@lru_cache(maxsize=None)
+def glyph_widths(font_name):
+    """Advance widths, in thousandths of the font size, of every glyph of a registered TTF font."""
+    from reportlab.pdfbase import pdfmetrics
+
+    face = pdfmetrics.getFont(font_name).face
+    return face.charWidths, face.defaultWidth
+
+
+def text_width(text, font_name, size):
+    widths, default = glyph_widths(font_name)
+    return sum(widths.get(ord(c), default) for c in text) * size / 1000
+
+
+@lru_cache(maxsize=16384)
+def fit_text(text, font_name, size, width):
+    """Returns (size, text) fitting width Points, remembered for repeated values. The
+    size shrinks by half Points down to MIN_FIT of the original before the text is
+    shortened with an ellipsis."""
+    natural = text_width(text, font_name, 1)
+    smallest = size * MIN_FIT
+    if natural * smallest > width:
+        size = smallest
+    elif natural * size > width:
+        # Largest half Point size that fits, but no smaller than smallest
+        return max(floor(2 * width / natural) / 2, smallest), text
+    else:
+        return size, text
+
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if text_width(text[:middle].rstrip() + "…", font_name, size) <= width:
+            low = middle
+        else:
+            high = middle - 1
+    return size, text[:low].rstrip() + "…"
+
+
+def data_path(name):
+    return os.path.join(DATA_DIR, name)
+
+
 def generate_label(profession):
     return ", ".join(
         e
@@ -893,8 +3272,58 @@ def generate_label(profession):
     )
 
 
-def get_options():
+def get_options(args=None):
     """Get options and arguments from argv string."""
+    parser = build_parser()
+    options = parser.parse_args(args)
+    # The options of run are the defaults of its jobs, checked with each job
+    if options.command == "run":
+        return options
+    if options.command == "analyze":
+        options.output = options.output or "-"
+    elif not options.output:
+        options.output = f"DeltaGreenPregen-{datetime.now():%Y-%m-%d-%H-%M}.{options.format}"
+    try:
+        check_options(options)
+    except ValueError as e:
+        parser.error(str(e))
+    return options
+
+
+def check_options(options):
+    """Raise ValueError if the options don't go together."""
+    if options.command != "analyze" and options.output == "-" and options.format == "pdf":
+        raise ValueError("PDF output can't be written to standard output, use --format jsonl or csv")
+    if (options.command == "query" or options.format == "none") and not options.store:
+        raise ValueError("query and --format none need --store")
+    if options.require:
+        parse_requirements(tuple(options.require))
+    if options.command == "serve" and options.profile:
+        raise ValueError("--profile doesn't apply to serve, whose characters are made on its --workers")
+    if options.command == "analyze":
+        if options.samples < 1:
+            raise ValueError("--samples must be at least 1")
+        if options.precision is not None and options.precision <= 0:
+            raise ValueError("--precision must be more than 0")
+        if options.require:
+            raise ValueError("--require doesn't apply to analyze, which samples every character")
+    if options.volume_size is not None:
+        if options.volume_size < 1:
+            raise ValueError("--volume-size must be at least 1")
+        if options.format != "pdf":
+            raise ValueError("--volume-size only applies to PDF output")
+    if options.pipeline is not None and options.pipeline < 1:
+        raise ValueError("--pipeline must be at least 1")
+    if options.section_cache:
+        if options.format != "pdf" or options.command:
+            raise ValueError("--section-cache only applies to writing a PDF")
+        if options.seed is None:
+            raise ValueError("--section-cache needs --seed, unseeded sections are never the same")
+        if options.volume_size or options.unique_names or options.store:
+            raise ValueError("--section-cache can't be used with --volume-size, --unique-names or --store")
+
+
+def build_parser():
     parser = argparse.ArgumentParser(description=description)
     parser.add_argument(
         "-v",
@@ -909,8 +3338,18 @@ def get_options():
         "-o",
         "--output",
         action="store",
-        default=f"DeltaGreenPregen-{datetime.now():%Y-%m-%d-%H-%M}.pdf",
-        help="Output PDF file. Defaults to %(default)s.",
+        help="Output file, or - for standard output with --format jsonl or csv. "
+        f"Defaults to DeltaGreenPregen-{datetime.now():%Y-%m-%d-%H-%M}.pdf (or .jsonl, .csv).",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        action="store",
+        choices=["pdf", "jsonl", "csv", "none"],
+        default="pdf",
+        help="Output format - defaults to %(default)s. "
+        "jsonl and csv write the character data without rendering sheets, and none only "
+        "writes them to --store.",
     )
     parser.add_argument(
         "-t", "--type", action="store", help=f"Select single profession to generate."
@@ -935,13 +3374,160 @@ def get_options():
         default=True,
     )
 
+    parser.add_argument(
+        "-s",
+        "--seed",
+        action="store",
+        help="Seed for reproducible characters. Each character gets its own random stream, "
+        "so the same seed gives the same characters with any --jobs.",
+    )
+    parser.add_argument(
+        "--require",
+        action="append",
+        metavar="CLAUSES",
+        help="Only generate characters meeting these, e.g. \"str >= 15, firearms >= 70, not damaged\". "
+        "A clause compares a stat, derived attribute, skill or age with a number, or is "
+        "\"damaged\" or \"not damaged\". Can be given more than once.",
+    )
+    parser.add_argument(
+        "--store",
+        metavar="ROSTER.db",
+        help="Also write the characters to this SQLite database, for the query command.",
+    )
+    parser.add_argument(
+        "--unique-names",
+        action="store_true",
+        help="Never give two characters the same name.",
+        default=False,
+    )
+    parser.add_argument(
+        "--profile",
+        action="store",
+        metavar="OUT.json",
+        help="Write per-stage timings, hot-path counters and peak memory to this file. "
+        "Tracing memory slows the run down, rendering especially.",
+    )
+    parser.add_argument(
+        "--volume-size",
+        type=int,
+        metavar="N",
+        help="Split the PDF into volumes of N characters, each with its own cover, table of "
+        "contents and bookmarks, written as e.g. roster-vol001.pdf. Memory use depends on N, "
+        "not on the size of the roster.",
+    )
+    parser.add_argument(
+        "--section-cache",
+        metavar="DIR",
+        help="Keep each profession's pages of a seeded PDF in this directory, and reuse them "
+        "when the profession, its kit, the options and the seed are the same, so a roster is "
+        "rebuilt by rendering only the professions that changed. Needs pdfrw.",
+    )
+    parser.add_argument(
+        "--background",
+        action="store",
+        choices=["raster", "vector"],
+        default="raster",
+        help="Character sheet background - the JPEG images, or the vector PDF (needs pdfrw). "
+        "Defaults to %(default)s.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        action="store",
+        default=1,
+        help="Generate characters on this many processes - defaults to %(default)s.",
+    )
+    parser.add_argument(
+        "--pipeline",
+        type=int,
+        metavar="DEPTH",
+        help=f"Generate characters on --jobs worker processes, even just one, while they are "
+        f"rendered, with at most DEPTH shards of {SHARD_SIZE} characters generated ahead. "
+        "Defaults to twice --jobs when --jobs is more than 1. -vv or --profile report how "
+        "long rendering waited for the workers and how full the pipeline was.",
+    )
+
+    commands = parser.add_subparsers(dest="command", title="Commands")
+    serve_parser = commands.add_parser(
+        "serve", help="Serve characters over HTTP, keeping the data and fonts loaded."
+    )
+    serve_parser.add_argument(
+        "--host", action="store", default="127.0.0.1", help="Defaults to %(default)s."
+    )
+    serve_parser.add_argument(
+        "--port", type=int, action="store", default=8000, help="Defaults to %(default)s."
+    )
+    serve_parser.add_argument(
+        "--workers",
+        type=int,
+        action="store",
+        default=0,
+        help="Worker processes generating characters - defaults to one per CPU.",
+    )
+    serve_parser.add_argument(
+        "--queue",
+        type=int,
+        action="store",
+        default=32,
+        help="Requests to accept at once before answering 503 - defaults to %(default)s.",
+    )
+    query_parser = commands.add_parser(
+        "query",
+        help="Write characters from --store instead of generating them: those of -t meeting "
+        "--require, at most -c of them, as --format.",
+    )
+    query_parser.add_argument(
+        "--random", action="store_true", help="Pick the characters at random, not oldest first."
+    )
+    query_parser.add_argument(
+        "--take", action="store_true", help="Remove the characters from the store."
+    )
+    analyze_parser = commands.add_parser(
+        "analyze",
+        help="Write the distributions of stats, skills and veterancy outcomes of large samples "
+        "of each profession as JSON, to --output or standard output. Needs NumPy.",
+    )
+    analyze_parser.add_argument(
+        "--samples",
+        type=int,
+        action="store",
+        default=100000,
+        help="Characters to sample of each profession - defaults to %(default)s.",
+    )
+    analyze_parser.add_argument(
+        "--precision",
+        type=float,
+        action="store",
+        help="Stop sampling a profession once every probability of a value being at least x "
+        "is known to within this, e.g. 0.005, at 95%% confidence.",
+    )
+
+    run_parser = commands.add_parser(
+        "run",
+        help="Run the roster jobs of a YAML or JSON manifest in one process, or on --jobs "
+        "processes, sharing the loaded data and fonts, and report how long each took.",
+    )
+    run_parser.add_argument(
+        "manifest",
+        help="A list of jobs, or a mapping of defaults and jobs, each job a mapping of "
+        "options by their option name, e.g. count: 4 or min_age: 30.",
+    )
+
     data = parser.add_argument_group(title="Data", description="Data file locations")
     data.add_argument(
         "--professions",
         action="store",
-        default="data/professions.json",
+        default=data_path("professions.json"),
         help="Data file for professions - defaults to %(default)s",
     )
+    data.add_argument(
+        "--no-data-cache",
+        action="store_false",
+        dest="data_cache",
+        help="Always read the data files instead of using the compiled data cache.",
+        default=True,
+    )
     parser.add_argument(
         "-a",
         "--min-age",
@@ -973,41 +3559,226 @@ def get_options():
         default=True,
     )
 
-    return parser.parse_args()
+    return parser
+
+
+class LineTable(Sequence):
+    """The lines of a text file, read from a memory map of it when they're used.
+
+    Only an index of where each line starts is kept in memory, 4 bytes a line, so
+    a random line is picked in O(1) and only the lines picked are decoded, however
+    large the file is. The lines are those of open(path).read().splitlines() for a
+    file with \n or \r\n line endings. Pickles as the path and the index, and
+    maps the file again when the copy is first used."""
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        # The start of each line, and the end of the file
+        self.offsets = array("I" if size < 2**32 else "Q", [0])
+        if size:
+            self.offsets.extend(accumulate(map(len, iter(self._map.readline, b""))))
+
+    def __getstate__(self):
+        return {"path": self.path, "offsets": self.offsets}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._map = None
+
+    def _mapped(self):
+        if self._map is None:
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        offsets = self.offsets
+        if not (type(i) is int and 0 <= i < len(offsets) - 1):
+            if isinstance(i, slice):
+                return [self[j] for j in range(*i.indices(len(self)))]
+            try:
+                # Any integer type, such as NumPy's, as list indices take
+                i = index(i)
+            except TypeError:
+                raise TypeError(
+                    f"LineTable indices must be integers or slices, not {type(i).__name__}"
+                ) from None
+            if i < 0:
+                i += len(self)
+            if not 0 <= i < len(self):
+                raise IndexError("LineTable index out of range")
+        line = (self._map or self._mapped())[offsets[i]:offsets[i + 1]]
+        if line.endswith(b"\n"):
+            line = line[:-2] if line.endswith(b"\r\n") else line[:-1]
+        return line.decode()
+
+    def __repr__(self):
+        return f"LineTable({self.path!r}, {len(self)} lines)"
 
 
 @dataclass
 class Data:
-    male_given_names: List[str]
-    female_given_names: List[str]
-    family_names: List[str]
-    towns: List[str]
+    male_given_names: LineTable
+    female_given_names: LineTable
+    family_names: LineTable
+    towns: LineTable
     professions: Dict[str, Any]
     kits: Dict[str, Any]
     weapons: Dict[str, Any]
     armour: Dict[str, Any]
     distinguishing: Dict[Tuple[str, int], List[str]]
+    kit_plans: Dict[str, "Kit"]
+
+
+@dataclass(frozen=True)
+class Kit:
+    """An equipment kit compiled by compile_kits().
+
+    weapons is a plan of (kind, chance, choice) steps. kind is "weapon", with the
+    weapon as its choice, or "one-of", with a tuple of plans to pick one of.
+    chance is None when the step always applies. gear is a tuple of
+    (chance, notes, text, wrapped lines) items, with the lines None when the item
+    has notes, because its footnote markers depend on the character."""
+    weapons: Tuple[Tuple[str, Any, Any], ...]
+    gear: Tuple[Tuple[int, Any, str, Any], ...]
+
+
+def compile_kits(kits, weapons, armour, professions):
+    """Compile the equipment kits into flat plans, and check every weapon, armour
+    and kit they and the professions refer to."""
+
+    def compile_weapons(kit_name, entries):
+        plan = []
+        for entry in entries:
+            chance = entry.get("chance")
+            if "type" in entry:
+                if entry["type"] not in weapons:
+                    raise ValueError(f"Kit {kit_name}: unknown weapon type {entry['type']!r}")
+                weapon = copy(weapons[entry["type"]])
+                if "notes" in entry:
+                    weapon["notes"] = entry["notes"]
+                plan.append(("weapon", chance, weapon))
+            elif "one-of" in entry:
+                choices = tuple(compile_weapons(kit_name, [e]) for e in entry["one-of"])
+                if not choices:
+                    raise ValueError(f"Kit {kit_name}: one-of with nothing to choose from")
+                plan.append(("one-of", chance, choices))
+            elif "both" in entry:
+                if chance is not None:
+                    raise ValueError(f"Kit {kit_name}: both can't have a chance")
+                plan += compile_weapons(kit_name, entry["both"])
+            else:
+                raise ValueError(f"Kit {kit_name}: don't understand weapon {entry!r}")
+        return tuple(plan)
+
+    def compile_gear(kit_name, item):
+        if "type" in item:
+            if item["type"] not in armour:
+                raise ValueError(f"Kit {kit_name}: unknown armour type {item['type']!r}")
+            text = armour[item["type"]]
+        elif "text" in item:
+            text = item["text"]
+        else:
+            raise ValueError(f"Kit {kit_name}: don't understand gear {item!r}")
+        notes = tuple(item.get("notes", ()))
+        lines = None if notes else wrap_text(text, GEAR_WRAP)
+        return item.get("chance", 100), notes, text, lines
+
+    compiled = {
+        name: Kit(
+            weapons=compile_weapons(name, kit["weapons"]),
+            gear=tuple(compile_gear(name, item) for item in kit["armour"] + kit["gear"]),
+        )
+        for name, kit in kits.items()
+    }
+    for key, profession in professions.items():
+        kit_name = profession.get("equipment-kit")
+        if kit_name and kit_name not in compiled:
+            raise ValueError(f"Profession {key}: unknown equipment kit {kit_name!r}")
+    return compiled
+
+
+# Bump when the shape of Data changes, so stale data caches are rebuilt
+DATA_CACHE_FORMAT = 3
+DATA_SOURCES = (
+    data_path("boys1986.txt"),
+    data_path("girls1986.txt"),
+    data_path("surnames.txt"),
+    data_path("towns.txt"),
+    data_path("equipment.json"),
+    data_path("distinguishing-features.csv"),
+)
 
 
 def load_data(options):
-    with open("data/boys1986.txt") as f:
-        male_given_names = f.read().splitlines()
-    with open("data/girls1986.txt") as f:
-        female_given_names = f.read().splitlines()
-    with open("data/surnames.txt") as f:
-        family_names = f.read().splitlines()
-    with open("data/towns.txt") as f:
-        towns = f.read().splitlines()
+    """Load Data from the compiled data cache, or from the source files if any of
+    them has changed since the cache was written."""
+    if not options.data_cache:
+        return read_data(options)
+
+    cache_path, fingerprint = data_cache_key(options.professions)
+    try:
+        with open(cache_path, "rb") as f:
+            cache_format, cache_fingerprint, data = pickle.load(f)
+        if (cache_format, cache_fingerprint) == (DATA_CACHE_FORMAT, fingerprint):
+            logger.debug("Loaded data from %s", cache_path)
+            return data
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, ValueError, TypeError):
+        pass
+
+    import tempfile
+
+    data = read_data(options)
+    try:
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(cache_path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((DATA_CACHE_FORMAT, fingerprint, data), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, cache_path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        logger.debug("Wrote data cache %s", cache_path)
+    except OSError as e:
+        logger.info("Couldn't write data cache %s: %s", cache_path, e)
+    return data
+
+
+def data_cache_key(professions):
+    """Path of the data cache for a professions file, and the fingerprint
+    (path, mtime and size of every source file) it must match. This module is one
+    of the sources, as it compiles parts of the data. The classes in the cache are
+    pickled by module name, which is __main__ on the command line and generator as
+    a library, so each has a cache of its own."""
+    sources = [os.path.abspath(path) for path in DATA_SOURCES + (__file__, professions)]
+    fingerprint = tuple(
+        (path, stat.st_mtime_ns, stat.st_size) for path, stat in ((p, os.stat(p)) for p in sources)
+    )
+    name = hashlib.sha1(f"{__name__}:{sources[-1]}".encode()).hexdigest()[:12]
+    return os.path.join(os.path.dirname(sources[0]), f".dggen-{name}.cache"), fingerprint
+
+
+def read_data(options):
+    male_given_names = LineTable(data_path("boys1986.txt"))
+    female_given_names = LineTable(data_path("girls1986.txt"))
+    family_names = LineTable(data_path("surnames.txt"))
+    towns = LineTable(data_path("towns.txt"))
     with open(options.professions) as f:
         professions = json.load(f)
-    with open("data/equipment.json") as f:
+    with open(data_path("equipment.json")) as f:
         equipment = json.load(f)
         kits = equipment["kits"]
         weapons = equipment["weapons"]
         armour = equipment["armour"]
 
     distinguishing = {}
-    with open("data/distinguishing-features.csv") as f:
+    with open(data_path("distinguishing-features.csv")) as f:
         for row in csv.DictReader(f):
             for value in range(int(row["from"]), int(row["to"]) + 1):
                 distinguishing.setdefault((row["statistic"], value), []).append(
@@ -1024,6 +3795,7 @@ def load_data(options):
         weapons=weapons,
         armour=armour,
         distinguishing=distinguishing,
+        kit_plans=compile_kits(kits, weapons, armour, professions),
     )
     return data
 
@@ -0,0 +1,24 @@
+import pytest
+
+import generator
+
+
+def test_seeded_characters_are_the_roster():
+    whole = [c.d["name"] for c in generator.generate("agent", count=5, seed=3)]
+    assert [c.d["name"] for c in generator.generate("agent", count=2, seed=3, start=3)] == whole[3:]
+
+
+@pytest.mark.parametrize(
+    "kwargs, error",
+    [
+        ({"profession_key": "nope"}, KeyError),
+        ({"profession_key": "agent", "pipeline": 0}, ValueError),
+        ({"profession_key": "agent", "require": ["str >> 3"]}, ValueError),
+        ({"profession_key": "agent", "require": ["str >= 19"]}, generator.UnmetRequirementError),
+        ({"profession_key": "agent", "colour": "red"}, TypeError),
+    ],
+)
+def test_errors_when_called(kwargs, error):
+    # Before the first character is asked for
+    with pytest.raises(error):
+        generator.generate(**kwargs)
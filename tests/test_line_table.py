@@ -0,0 +1,46 @@
+import pytest
+
+import generator
+
+
+class Index(object):
+    """An integer type other than int, such as NumPy's."""
+
+    def __init__(self, i):
+        self.i = i
+
+    def __index__(self):
+        return self.i
+
+
+@pytest.fixture
+def table(tmp_path):
+    path = tmp_path / "lines.txt"
+    path.write_bytes(b"one\ntwo\r\nthree\n")
+    return generator.LineTable(str(path))
+
+
+LINES = ["one", "two", "three"]
+
+
+@pytest.mark.parametrize("i", [0, 2, -1, -3, True, Index(1), Index(-2)])
+def test_index_like_a_list(table, i):
+    assert table[i] == LINES[i]
+
+
+@pytest.mark.parametrize("i", [3, -4, Index(3)])
+def test_index_out_of_range(table, i):
+    with pytest.raises(IndexError):
+        table[i]
+
+
+@pytest.mark.parametrize("i", ["1", 1.0, None])
+def test_index_not_an_integer(table, i):
+    with pytest.raises(TypeError):
+        table[i]
+
+
+def test_slices(table):
+    assert table[:] == LINES
+    assert table[::-1] == LINES[::-1]
+    assert table[Index(1):] == LINES[1:]
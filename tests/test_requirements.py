@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+import generator
+
+
+def profession(professions, key):
+    with open(generator.data_path(professions)) as f:
+        return json.load(f)[key]
+
+
+@pytest.mark.parametrize(
+    "professions, key, requirement",
+    [
+        # Suggested bonus skills that are also in ALL_BONUS can be boosted twice
+        ("professions-fbi.json", "cid", "forensics >= 70"),
+        ("professions-cia.json", "do-case-officer", "bureaucracy >= 70"),
+        ("professions-socom.json", "green-berets", "demolitions >= 70"),
+    ],
+)
+def test_double_bonus_is_possible(professions, key, requirement):
+    options = generator.get_options(["--require", requirement])
+    requirements = generator.parse_requirements(tuple(options.require))
+    requirements.stages(profession(professions, key), options)
+
+
+def test_beyond_bonus_cap_is_impossible():
+    options = generator.get_options(["--require", "forensics >= 90"])
+    requirements = generator.parse_requirements(tuple(options.require))
+    with pytest.raises(generator.UnmetRequirementError):
+        requirements.stages(profession("professions-fbi.json", "cid"), options)
+
+
+def test_stages_follow_the_profession():
+    options = generator.get_options(["--require", "forensics >= 70"])
+    requirements = generator.parse_requirements(tuple(options.require))
+    cid = profession("professions-fbi.json", "cid")
+    stages = requirements.stages(cid, options)
+    assert requirements.stages(cid, options) is stages
+    # As if cid had been freed and another profession had been given its id
+    other = profession("professions-fbi.json", "cid")
+    requirements._stages = {
+        (id(other),) + key[1:]: cached for key, cached in requirements._stages.items()
+    }
+    assert requirements.stages(other, options).profession is other
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import threading
+import time
+from http.client import HTTPConnection
+
+import pytest
+
+import generator
+
+
+@pytest.fixture(scope="module")
+def server():
+    options = generator.get_options(["serve", "--port", "0", "--workers", "1"])
+    agent_server = generator.AgentServer(generator.load_data(options), options)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_until_complete, args=(agent_server.run(),))
+    thread.start()
+    deadline = time.monotonic() + 30
+    while agent_server.port is None:
+        assert thread.is_alive() and time.monotonic() < deadline, "the server didn't start"
+        time.sleep(0.01)
+    yield agent_server
+    loop.call_soon_threadsafe(agent_server.server.close)
+    thread.join(30)
+    loop.close()
+
+
+def request(server, path, method="GET"):
+    connection = HTTPConnection("127.0.0.1", server.port, timeout=30)
+    try:
+        connection.request(method, path)
+        response = connection.getresponse()
+        return response.status, response.getheader("Content-Type"), response.read()
+    finally:
+        connection.close()
+
+
+def test_agents_json(server):
+    status, content_type, body = request(server, "/agents?type=agent&count=3&seed=1")
+    assert (status, content_type) == (200, "application/json")
+    agents = json.loads(body)
+    assert len(agents) == 3
+    assert {agent["type"] for agent in agents} == {"agent"}
+    # The same characters as the library generates with the seed
+    expected = [c.d["name"] for c in generator.generate("agent", count=3, seed="1")]
+    assert [agent["d"]["name"] for agent in agents] == expected
+
+
+def test_agents_json_is_seeded(server):
+    first = request(server, "/agents?type=agent&count=2&seed=7")[2]
+    assert request(server, "/agents?type=agent&count=2&seed=7")[2] == first
+
+
+def test_agents_pdf(server):
+    status, content_type, body = request(server, "/agents?type=agent&count=2&format=pdf")
+    assert (status, content_type) == (200, "application/pdf")
+    assert body.startswith(b"%PDF")
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "type=agent&count=0",
+        f"type=agent&count={generator.AgentServer.MAX_COUNT + 1}",
+        "type=agent&count=many",
+        "type=nope&count=1",
+        "count=1",
+        "type=agent&format=csv",
+    ],
+)
+def test_bad_requests(server, query):
+    assert request(server, f"/agents?{query}")[0] == 400
+
+
+def test_only_get(server):
+    assert request(server, "/agents?type=agent", method="POST")[0] == 405
+
+
+def test_not_found(server):
+    assert request(server, "/nothing")[0] == 404
+
+
+def test_metrics(server):
+    before = request(server, "/metrics")[2].decode()
+    request(server, "/agents?type=agent&count=1")
+    request(server, "/agents?type=nope")
+    status, content_type, body = request(server, "/metrics")
+    assert (status, content_type) == (200, "text/plain; version=0.0.4")
+    assert requests_total(body.decode(), 200) == requests_total(before, 200) + 2
+    assert requests_total(body.decode(), 400) == requests_total(before, 400) + 1
+    assert "dggen_jobs_in_flight 0" in body.decode()
+
+
+def test_disconnect_cancels_shards(server):
+    connection = HTTPConnection("127.0.0.1", server.port, timeout=30)
+    connection.request("GET", f"/agents?type=agent&count={generator.AgentServer.MAX_COUNT}")
+    connection.getresponse()
+    connection.close()
+    deadline = time.monotonic() + 30
+    while server.jobs or server.active:
+        assert time.monotonic() < deadline, "shards of a closed request are still queued"
+        time.sleep(0.01)
+    assert request(server, "/agents?type=agent&count=1")[0] == 200
+
+
+def requests_total(metrics, status):
+    for line in metrics.splitlines():
+        if line.startswith(f'dggen_requests_total{{status="{status}"}}'):
+            return int(line.split()[-1])
+    return 0
@@ -0,0 +1,37 @@
+from collections import Counter
+from fractions import Fraction
+from itertools import accumulate
+
+import pytest
+
+import generator
+
+
+def per_check_outcomes(start, checks):
+    """Exact distribution of the skill after the per-check loop veterancy used to run:
+
+        roll = randint(1, 100)
+        if roll > current or roll == 100:
+            current += 1
+
+    enumerating each of the 100 rolls of every check, as how many of the 100 ** checks
+    sequences of rolls end on each value."""
+    outcomes = Counter({start: 1})
+    for _ in range(checks):
+        after = Counter()
+        for current, sequences in outcomes.items():
+            for roll in range(1, 101):
+                improved = roll > current or roll == 100
+                after[current + improved] += sequences
+        outcomes = after
+    return [Fraction(outcomes[value], 100 ** checks) for value in range(start, start + checks + 1)]
+
+
+@pytest.mark.parametrize("start", [1, 10, 30, 50, 79, 80, 98, 99, 100, 120])
+@pytest.mark.parametrize("checks", [0, 1, 2, 7, 30, 62])
+def test_outcomes_match_per_check_rolls(start, checks):
+    table = generator.Need2KnowCharacter.skill_check_outcomes(start, checks)
+    expected = list(accumulate(per_check_outcomes(start, checks)))
+    assert len(table) == checks + 1
+    assert table == pytest.approx([float(p) for p in expected], abs=1e-12)
+    assert table[-1] == pytest.approx(1)